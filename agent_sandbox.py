@@ -0,0 +1,166 @@
+"""Isolated execution of agent-generated pandas code.
+
+The LangChain pandas agent writes Python that would otherwise run inside the
+Streamlit server process. Here every tool call runs in a fresh worker process
+with CPU-time and memory limits, memory-maps the dataset from a read-only
+Arrow snapshot and is killed when it exceeds the wall-clock timeout. Each call starts from a
+clean namespace, so variables do not persist between agent steps.
+"""
+import ast
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock timeout is enforced
+    resource = None
+
+SANDBOX_TIMEOUT = 30  # seconds (wall clock)
+SANDBOX_CPU_SECONDS = 20
+SANDBOX_MEMORY_MB = 2048  # headroom on top of the memory-mapped dataset snapshot
+SANDBOX_MAX_OUTPUT_CHARS = 4000
+SANDBOX_DIR = os.path.join(tempfile.gettempdir(), 'amazon_sales_sandbox')
+SANDBOX_MAX_SNAPSHOTS = 3  # most recently used dataset snapshots kept on disk
+
+def publish_dataset(df, fingerprint):
+    """Write a read-only snapshot of the dataset for sandbox workers"""
+    os.makedirs(SANDBOX_DIR, exist_ok=True)
+    path = os.path.join(SANDBOX_DIR, f'{fingerprint}.feather')
+
+    try:
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        # Uncompressed Arrow so workers can map the columns instead of unpickling a copy
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+        _prune_snapshots()
+
+    return path
+
+def _prune_snapshots(keep=SANDBOX_MAX_SNAPSHOTS):
+    """Delete all but the keep most recently used dataset snapshots"""
+    snapshots = []
+    for name in os.listdir(SANDBOX_DIR):
+        if name.endswith('.feather'):
+            try:
+                snapshots.append((os.stat(os.path.join(SANDBOX_DIR, name)).st_mtime, name))
+            except OSError:
+                continue
+
+    for _, name in sorted(snapshots, reverse=True)[keep:]:
+        try:
+            os.remove(os.path.join(SANDBOX_DIR, name))
+        except OSError:
+            pass
+
+def load_dataset(path):
+    """Memory-map a published snapshot; numeric and string columns stay backed by the file"""
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+def sanitize_code(code):
+    """Strip markdown fences and a leading 'python' the LLM sometimes adds"""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+def _apply_limits(cpu_seconds, memory_mb):
+    """Apply CPU-time and address-space limits to the current process"""
+    if resource is None:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory_bytes = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+def _execute(code, df):
+    """Run code like PythonAstREPLTool: value of the last expression or stdout"""
+    tree = ast.parse(code)
+    namespace = {'df': df, 'pd': pd, 'np': np}
+
+    exec(ast.unparse(ast.Module(tree.body[:-1], type_ignores=[])), namespace)
+    last_statement = ast.unparse(ast.Module(tree.body[-1:], type_ignores=[]))
+
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            result = eval(last_statement, namespace)
+        except SyntaxError:
+            exec(last_statement, namespace)
+            result = None
+
+    return buffer.getvalue() if result is None else str(result)
+
+def _worker(code, dataset_path, conn, cpu_seconds, memory_mb):
+    """Sandbox process entry point"""
+    try:
+        _apply_limits(cpu_seconds, memory_mb)
+        df = load_dataset(dataset_path)
+        output = _execute(code, df)
+        conn.send(('ok', output[:SANDBOX_MAX_OUTPUT_CHARS]))
+    except MemoryError:
+        conn.send(('error', f'MemoryError: execution exceeded the {memory_mb} MB memory limit'))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+class SandboxedExecutor:
+    """Run agent tool calls in resource-limited worker processes"""
+
+    def __init__(self, df, fingerprint, timeout=SANDBOX_TIMEOUT,
+                 cpu_seconds=SANDBOX_CPU_SECONDS, memory_mb=SANDBOX_MEMORY_MB):
+        self.dataset_path = publish_dataset(df, fingerprint)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        # The mapped snapshot counts against the address-space limit, so the limit grows with it
+        self.memory_mb = memory_mb + os.path.getsize(self.dataset_path) // (1024 * 1024) + 1
+        # spawn keeps workers independent of the server's threads and imports
+        self._context = mp.get_context('spawn')
+
+    def run(self, code):
+        """Execute code in a worker and return its output or an error string"""
+        code = sanitize_code(code)
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker,
+            args=(code, self.dataset_path, sender, self.cpu_seconds, self.memory_mb),
+            daemon=True
+        )
+        process.start()
+        sender.close()
+
+        try:
+            if receiver.poll(self.timeout):
+                status, output = receiver.recv()
+                return output
+            return f'TimeoutError: execution exceeded {self.timeout}s and was cancelled'
+        except EOFError:
+            # Worker died without reporting, e.g. killed by the CPU-time limit
+            return f'ResourceError: execution was stopped (CPU limit {self.cpu_seconds}s / memory limit {self.memory_mb} MB)'
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+
+    def as_tool(self):
+        """Expose the executor as the agent's python_repl_ast tool"""
+        from langchain_core.tools import Tool
+
+        return Tool(
+            name='python_repl_ast',
+            func=self.run,
+            description=(
+                'A Python shell. Use this to execute python commands. Input should be a valid '
+                'python command. The dataframe is available as `df`. Each call runs in a fresh '
+                'session, so include every step the result depends on.'
+            )
+        )
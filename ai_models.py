@@ -8,7 +8,30 @@ import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain.agents.agent_types import AgentType
+from agent_sandbox import SandboxedExecutor
+from llm_backends import (
+    GeminiBackend,
+    BackendLLM,
+    GovernedBackend,
+    GovernorCallbackHandler,
+    LLMGovernor,
+    BACKGROUND,
+    llm_priority
+)
+from data_processor import get_data_fingerprint
 import os
+import json
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+# Backend used for every LLM call; None means the real Gemini API
+_llm_backend = None
+_default_backend = GeminiBackend()
+
+# Shared by every session: rate limit and concurrency cap for outbound LLM traffic
+_llm_governor = LLMGovernor()
 
 # Configure Gemini API
 def configure_gemini(api_key):
@@ -23,12 +46,29 @@ def get_gemini_llm(api_key, model="gemini-2.5-flash"):
         model=model,
         google_api_key=api_key,
         temperature=0.7,
-        convert_system_message_to_human=True
+        convert_system_message_to_human=True,
+        callbacks=[GovernorCallbackHandler(_llm_governor)]
     )
 
+def set_llm_backend(backend):
+    """Route all LLM calls through backend (None restores the Gemini API)"""
+    global _llm_backend
+    _llm_backend = backend
+
+def get_llm_backend():
+    """Return the rate-limited backend used for LLM calls"""
+    return GovernedBackend(_llm_backend or _default_backend, _llm_governor)
+
+def get_llm_governor():
+    """Return the process-wide LLM rate limiter and concurrency governor"""
+    return _llm_governor
+
 def create_data_agent(df, api_key):
     """Create LangChain agent that can analyze the dataframe"""
-    llm = get_gemini_llm(api_key)
+    if _llm_backend is None:
+        llm = get_gemini_llm(api_key)
+    else:
+        llm = BackendLLM(backend=get_llm_backend())
     
     agent = create_pandas_dataframe_agent(
         llm,
@@ -40,13 +80,16 @@ def create_data_agent(df, api_key):
         max_iterations=5
     )
     
+    # Agent-generated code runs in a resource-limited worker process instead of
+    # the Streamlit server; the tool keeps the name the agent prompt refers to
+    sandbox = SandboxedExecutor(df, get_data_fingerprint(df))
+    agent.tools = [sandbox.as_tool()]
+    
     return agent
 
 def analyze_with_gemini(prompt, api_key, data_context=None):
     """Use Gemini to analyze data and generate insights"""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         full_prompt = f"""Você é um analista de dados especializado em e-commerce.
         
 Contexto dos dados: {data_context if data_context else 'Dataset de vendas Amazon com 100k transações'}
@@ -55,38 +98,134 @@ Contexto dos dados: {data_context if data_context else 'Dataset de vendas Amazon
 
 Forneça uma análise profissional, concisa e acionável."""
         
-        response = model.generate_content(full_prompt)
-        return response.text
+        return get_llm_backend().generate(full_prompt)
     except Exception as e:
         return f"Erro ao gerar insights: {str(e)}"
 
-def generate_business_insights(df, metrics, api_key):
-    """Generate comprehensive business insights using Gemini"""
-    
-    # Prepare data summary
-    data_context = f"""
+# Rough budget for the data context sent with each prompt (~4 chars per token)
+MAX_CONTEXT_TOKENS = 1200
+CHARS_PER_TOKEN = 4
+
+# Context sections used by each automatic insight
+INSIGHT_SECTIONS = {
+    'business': ('kpis', 'categories', 'countries'),
+    'trends': ('monthly',),
+    'categories': ('category_table',)
+}
+
+@st.cache_data
+def get_ai_context_aggregates(df):
+    """Pre-aggregate the tables used to build LLM prompt context"""
+    monthly = df.groupby(df['OrderDate'].dt.to_period('M')).agg({
+        'TotalAmount': 'sum',
+        'OrderID': 'count'
+    })
+    monthly.index = monthly.index.astype(str)
+
+    categories = df.groupby('Category').agg({
+        'TotalAmount': ['sum', 'mean'],
+        'OrderID': 'count',
+        'Discount': 'mean'
+    }).round(2)
+    categories.columns = ['Total_Revenue', 'Avg_Order', 'Total_Orders', 'Avg_Discount']
+    categories = categories.sort_values('Total_Revenue', ascending=False)
+
+    countries = df.groupby('Country')['TotalAmount'].sum().sort_values(ascending=False)
+
+    return {
+        'monthly': monthly,
+        'categories': categories,
+        'countries': countries
+    }
+
+def estimate_tokens(text):
+    """Approximate the number of LLM tokens in a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def summarize_series(series, value_format='${:,.2f}', recent_points=6):
+    """Summarise a long series as statistics plus its most recent points"""
+    if len(series) <= recent_points * 2:
+        return '\n'.join(f"    {label}: {value_format.format(value)}" for label, value in series.items())
+
+    growth = (series.iloc[-1] / series.iloc[0] - 1) * 100 if series.iloc[0] else 0.0
+    recent = '\n'.join(f"    {label}: {value_format.format(value)}"
+                       for label, value in series.iloc[-recent_points:].items())
+
+    return f"""    Períodos: {len(series)} ({series.index[0]} a {series.index[-1]})
+    Média: {value_format.format(series.mean())} | Desvio padrão: {value_format.format(series.std())}
+    Mínimo: {value_format.format(series.min())} ({series.idxmin()})
+    Máximo: {value_format.format(series.max())} ({series.idxmax()})
+    Variação primeiro/último período: {growth:.1f}%
+    Últimos {recent_points} períodos:
+{recent}"""
+
+def build_data_context(df, metrics=None, sections=('kpis', 'categories', 'countries'),
+                       max_tokens=MAX_CONTEXT_TOKENS):
+    """Build a size-bounded prompt context from cached aggregates"""
+    aggregates = get_ai_context_aggregates(df)
+    monthly = aggregates['monthly']
+
+    builders = {
+        'kpis': lambda: f"""
     Total de Vendas: ${metrics['total_revenue']:,.2f}
     Total de Pedidos: {metrics['total_orders']:,}
     Ticket Médio: ${metrics['avg_order_value']:.2f}
     Taxa de Conversão: {metrics['conversion_rate']:.1f}%
     Taxa de Cancelamento: {metrics['cancellation_rate']:.1f}%
-    
+    """,
+        'categories': lambda: f"""
     Top 3 Categorias:
-    {df.groupby('Category')['TotalAmount'].sum().nlargest(3).to_string()}
-    
+    {aggregates['categories']['Total_Revenue'].head(3).to_string()}
+    """,
+        'countries': lambda: f"""
     Top 3 Países:
-    {df.groupby('Country')['TotalAmount'].sum().nlargest(3).to_string()}
+    {aggregates['countries'].head(3).to_string()}
+    """,
+        'category_table': lambda: f"""
+    Performance por categoria:
+    {aggregates['categories'].to_string()}
+    """,
+        'monthly': lambda: f"""
+    Vendas mensais (receita):
+{summarize_series(monthly['TotalAmount'])}
+
+    Pedidos mensais:
+{summarize_series(monthly['OrderID'], value_format='{:,.0f}')}
+
+    Estatísticas:
+    - Vendas médias mensais: ${monthly['TotalAmount'].mean():,.2f}
+    - Crescimento total: {((monthly['TotalAmount'].iloc[-1] / monthly['TotalAmount'].iloc[0] - 1) * 100):.1f}%
+    - Mês com maior venda: {monthly['TotalAmount'].idxmax()}
     """
-    
-    prompt = """Baseado nos dados acima, forneça:
+    }
+
+    # Sections are added in priority order until the token budget runs out
+    context = ''
+    for section in sections:
+        block = builders[section]()
+        if estimate_tokens(context + block) > max_tokens:
+            remaining = max(0, (max_tokens - estimate_tokens(context)) * CHARS_PER_TOKEN)
+            context += block[:remaining] + '\n    [contexto truncado]'
+            break
+        context += block
+
+    return context
+
+BUSINESS_INSIGHTS_PROMPT = """Baseado nos dados acima, forneça:
 
 1. **3 Insights Principais**: Padrões importantes identificados nos dados
 2. **3 Oportunidades**: Áreas com potencial de crescimento
 3. **3 Recomendações Acionáveis**: Ações específicas para melhorar o desempenho
 
 Seja específico e orientado a resultados de negócio."""
+
+def generate_business_insights(df, metrics, api_key):
+    """Generate comprehensive business insights using Gemini"""
+    
+    # Prepare data summary
+    data_context = build_data_context(df, metrics, sections=INSIGHT_SECTIONS['business'])
     
-    return analyze_with_gemini(prompt, api_key, data_context)
+    return analyze_with_gemini(BUSINESS_INSIGHTS_PROMPT, api_key, data_context)
 
 def ask_data_question(df, question, api_key):
     """Use LangChain agent to answer questions about the data"""
@@ -218,28 +357,7 @@ def generate_product_recommendations(df, customer_id=None, top_n=5):
         top_products = df.groupby('ProductName')['TotalAmount'].sum().nlargest(top_n)
         return top_products.reset_index()
 
-def analyze_sales_trends(df, api_key):
-    """Use Gemini to analyze sales trends"""
-    
-    # Prepare trend data
-    monthly_sales = df.groupby(df['OrderDate'].dt.to_period('M')).agg({
-        'TotalAmount': 'sum',
-        'OrderID': 'count'
-    }).reset_index()
-    
-    monthly_sales['OrderDate'] = monthly_sales['OrderDate'].astype(str)
-    
-    trend_context = f"""
-    Dados de vendas mensais:
-    {monthly_sales.to_string()}
-    
-    Estatísticas:
-    - Vendas médias mensais: ${monthly_sales['TotalAmount'].mean():,.2f}
-    - Crescimento total: {((monthly_sales['TotalAmount'].iloc[-1] / monthly_sales['TotalAmount'].iloc[0] - 1) * 100):.1f}%
-    - Mês com maior venda: {monthly_sales.loc[monthly_sales['TotalAmount'].idxmax(), 'OrderDate']}
-    """
-    
-    prompt = """Analise as tendências de vendas e forneça:
+SALES_TRENDS_PROMPT = """Analise as tendências de vendas e forneça:
 
 1. Padrão de crescimento observado
 2. Sazonalidade identificada
@@ -247,27 +365,16 @@ def analyze_sales_trends(df, api_key):
 4. Recomendações estratégicas
 
 Seja específico e orientado a ação."""
-    
-    return analyze_with_gemini(prompt, api_key, trend_context)
 
-def analyze_category_performance(df, api_key):
-    """Use Gemini to analyze category performance"""
-    
-    category_stats = df.groupby('Category').agg({
-        'TotalAmount': ['sum', 'mean'],
-        'OrderID': 'count',
-        'Discount': 'mean'
-    }).round(2)
-    
-    category_stats.columns = ['Total_Revenue', 'Avg_Order', 'Total_Orders', 'Avg_Discount']
-    category_stats = category_stats.sort_values('Total_Revenue', ascending=False)
+def analyze_sales_trends(df, api_key):
+    """Use Gemini to analyze sales trends"""
     
-    context = f"""
-    Performance por categoria:
-    {category_stats.to_string()}
-    """
+    # Long monthly histories are summarised to keep the prompt bounded
+    trend_context = build_data_context(df, sections=INSIGHT_SECTIONS['trends'])
     
-    prompt = """Analise o desempenho das categorias e forneça:
+    return analyze_with_gemini(SALES_TRENDS_PROMPT, api_key, trend_context)
+
+CATEGORY_PERFORMANCE_PROMPT = """Analise o desempenho das categorias e forneça:
 
 1. Categorias estrela (alto desempenho)
 2. Categorias com oportunidade de crescimento
@@ -275,5 +382,145 @@ def analyze_category_performance(df, api_key):
 4. Recomendações de mix de produtos
 
 Seja específico com números."""
+
+def analyze_category_performance(df, api_key):
+    """Use Gemini to analyze category performance"""
+    
+    context = build_data_context(df, sections=INSIGHT_SECTIONS['categories'])
+    
+    return analyze_with_gemini(CATEGORY_PERFORMANCE_PROMPT, api_key, context)
+
+INSIGHT_PROMPTS = {
+    'business': BUSINESS_INSIGHTS_PROMPT,
+    'trends': SALES_TRENDS_PROMPT,
+    'categories': CATEGORY_PERFORMANCE_PROMPT
+}
+
+# Precomputed insights are stored per dataset fingerprint
+INSIGHTS_CACHE_DIR = os.path.join('.cache', 'ai_insights')
+
+_precompute_jobs = {}
+_precompute_lock = threading.Lock()
+
+# Failed generations back off per (fingerprint, kind) before the background job retries them
+INSIGHT_RETRY_COOLDOWN = 300  # seconds, doubled for each consecutive failure
+INSIGHT_RETRY_MAX_COOLDOWN = 3600
+_insight_failures = {}  # (fingerprint, kind) -> (consecutive failures, monotonic time of the last one)
+
+def _insights_path(fingerprint):
+    return os.path.join(INSIGHTS_CACHE_DIR, f'{fingerprint}.json')
+
+def _context_hash(kind, context):
+    return hashlib.sha256(f'{kind}\n{context}'.encode('utf-8')).hexdigest()[:16]
+
+def get_insight_contexts(df, metrics):
+    """Prompt context of every insight kind (built on the script thread)"""
+    return {kind: build_data_context(df, metrics, sections=sections) for kind, sections in INSIGHT_SECTIONS.items()}
+
+def get_insight_input_hash(df, metrics, kind):
+    """Hash of the prompt context an insight is generated from"""
+    return _context_hash(kind, build_data_context(df, metrics, sections=INSIGHT_SECTIONS[kind]))
+
+def load_stored_insights(fingerprint):
+    """Load every stored insight for a dataset version"""
+    try:
+        with open(_insights_path(fingerprint), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def store_insight(fingerprint, kind, input_hash, text):
+    """Persist an insight together with the hash of its inputs"""
+    with _precompute_lock:
+        insights = load_stored_insights(fingerprint)
+        insights[kind] = {
+            'input_hash': input_hash,
+            'text': text,
+            'generated_at': datetime.now().strftime('%d/%m/%Y %H:%M')
+        }
+        os.makedirs(INSIGHTS_CACHE_DIR, exist_ok=True)
+        tmp_path = f'{_insights_path(fingerprint)}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(insights, f, ensure_ascii=False)
+        os.replace(tmp_path, _insights_path(fingerprint))
+
+def _record_insight_failure(fingerprint, kind):
+    with _precompute_lock:
+        failures, _ = _insight_failures.get((fingerprint, kind), (0, None))
+        _insight_failures[(fingerprint, kind)] = (failures + 1, time.monotonic())
+
+def insight_retry_in(fingerprint, kind):
+    """Seconds until a failed insight may be retried in the background (0 if it may run now)"""
+    failure = _insight_failures.get((fingerprint, kind))
+    if failure is None:
+        return 0.0
+    failures, failed_at = failure
+    cooldown = min(INSIGHT_RETRY_COOLDOWN * 2 ** (failures - 1), INSIGHT_RETRY_MAX_COOLDOWN)
+    return max(0.0, cooldown - (time.monotonic() - failed_at))
+
+def get_stored_insight(df, metrics, kind):
+    """Return the stored insight for the current data, or None if stale/missing"""
+    stored = load_stored_insights(get_data_fingerprint(df)).get(kind)
+    if stored and stored['input_hash'] == get_insight_input_hash(df, metrics, kind):
+        return stored
+    return None
+
+def _generate_and_store(fingerprint, kind, context, api_key):
+    """Run one insight prompt and store the result; failures start a retry cool-down"""
+    text = analyze_with_gemini(INSIGHT_PROMPTS[kind], api_key, context)
+    
+    # analyze_with_gemini reports failures as text; those are never stored
+    if text.startswith('Erro ao gerar insights'):
+        _record_insight_failure(fingerprint, kind)
+        return {'text': text, 'generated_at': None, 'error': True}
+    
+    _insight_failures.pop((fingerprint, kind), None)
+    store_insight(fingerprint, kind, _context_hash(kind, context), text)
+    return load_stored_insights(fingerprint)[kind]
+
+def generate_insight(df, metrics, kind, api_key):
+    """Generate one insight kind and store it; returns the stored record"""
+    context = build_data_context(df, metrics, sections=INSIGHT_SECTIONS[kind])
+    return _generate_and_store(get_data_fingerprint(df), kind, context, api_key)
+
+def precompute_insights(fingerprint, contexts, api_key):
+    """Generate the given insight kinds from prebuilt contexts (runs in a background thread)"""
+    # Background work yields to interactive requests in the LLM queue
+    with llm_priority(BACKGROUND):
+        for kind, context in contexts.items():
+            _generate_and_store(fingerprint, kind, context, api_key)
+
+def is_precompute_running(fingerprint):
+    """Whether a background precompute job is active for a dataset version"""
+    job = _precompute_jobs.get(fingerprint)
+    return job is not None and job.is_alive()
+
+def start_insights_precompute(df, metrics, api_key):
+    """Start a background job for insights that are missing or stale and not cooling down"""
+    fingerprint = get_data_fingerprint(df)
+    if is_precompute_running(fingerprint):
+        return False
+    
+    # Contexts come from st.cache_data aggregates, so they are built here on the script thread
+    stored = load_stored_insights(fingerprint)
+    contexts = {
+        kind: context for kind, context in get_insight_contexts(df, metrics).items()
+        if stored.get(kind, {}).get('input_hash') != _context_hash(kind, context)
+        and insight_retry_in(fingerprint, kind) == 0
+    }
+    if not contexts:
+        return False
+    
+    with _precompute_lock:
+        if is_precompute_running(fingerprint):
+            return False
+        job = threading.Thread(
+            target=precompute_insights,
+            args=(fingerprint, contexts, api_key),
+            name=f'insights-precompute-{fingerprint}',
+            daemon=True
+        )
+        _precompute_jobs[fingerprint] = job
+        job.start()
     
-    return analyze_with_gemini(prompt, api_key, context)
+    return True
@@ -0,0 +1,118 @@
+"""Benchmark the AI Insights pipeline offline.
+
+Record real Gemini responses once:
+    python benchmark_ai.py record --api-key YOUR_KEY
+
+Then replay them as often as needed, without network access:
+    python benchmark_ai.py replay --latency 0.5 --repeat 5
+
+The reported overhead is wall time minus simulated LLM latency, i.e. the time
+spent building prompts, running pandas and post-processing responses.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import ai_models
+from ai_models import (
+    configure_gemini,
+    generate_business_insights,
+    analyze_sales_trends,
+    analyze_category_performance,
+    ask_data_question
+)
+from data_processor import preprocess_data, get_summary_metrics
+from llm_backends import GeminiBackend, RecordingBackend, ReplayBackend
+
+QUESTIONS = [
+    'Qual é o produto mais vendido?',
+    'Qual país tem o maior ticket médio?'
+]
+
+def build_scenarios(df, metrics, api_key):
+    """Named callables covering every LLM entry point in ai_models"""
+    scenarios = [
+        ('generate_business_insights', lambda: generate_business_insights(df, metrics, api_key)),
+        ('analyze_sales_trends', lambda: analyze_sales_trends(df, api_key)),
+        ('analyze_category_performance', lambda: analyze_category_performance(df, api_key))
+    ]
+    for i, question in enumerate(QUESTIONS, 1):
+        scenarios.append((f'ask_data_question[{i}]', lambda q=question: ask_data_question(df, q, api_key)))
+    return scenarios
+
+def run_benchmark(scenarios, backend, repeat):
+    """Run each scenario and split wall time into LLM latency and overhead"""
+    results = []
+    for name, func in scenarios:
+        for run in range(repeat):
+            simulated_before = getattr(backend, 'simulated_seconds', 0.0)
+            started = time.perf_counter()
+            func()
+            wall = time.perf_counter() - started
+            latency = getattr(backend, 'simulated_seconds', 0.0) - simulated_before
+            results.append({
+                'Cenario': name,
+                'Execucao': 'fria' if run == 0 else 'quente',
+                'Total_s': wall,
+                'Latencia_LLM_s': latency,
+                'Overhead_s': wall - latency
+            })
+    return pd.DataFrame(results)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline dos recursos de IA')
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--data', default='Amazon.csv', help='CSV de vendas')
+    parser.add_argument('--recording', default='llm_recording.json', help='Arquivo de respostas gravadas')
+    parser.add_argument('--api-key', help='Chave Gemini (apenas no modo record)')
+    parser.add_argument('--latency', type=float, default=None,
+                        help='Latencia simulada fixa em segundos (padrao: latencia gravada)')
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='Multiplicador aplicado a latencia gravada')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rpm', type=float, default=1e6,
+                        help='Limite de requisicoes por minuto no modo replay (padrao: sem limite)')
+    args = parser.parse_args()
+
+    df = preprocess_data(pd.read_csv(args.data))
+    metrics = get_summary_metrics(df)
+
+    if args.mode == 'record':
+        if not args.api_key:
+            parser.error('--api-key e obrigatorio no modo record')
+        configure_gemini(args.api_key)
+        backend = RecordingBackend(GeminiBackend(), args.recording)
+        repeat = 1
+    else:
+        backend = ReplayBackend(args.recording, latency=args.latency, latency_scale=args.latency_scale)
+        repeat = args.repeat
+
+    ai_models.set_llm_backend(backend)
+    governor = ai_models.get_llm_governor()
+    if args.mode == 'replay':
+        # Replays should not be throttled by the limits meant for the real API
+        governor.reconfigure(requests_per_minute=args.rpm, burst=max(1, int(args.rpm)))
+    try:
+        results = run_benchmark(build_scenarios(df, metrics, args.api_key or 'offline'), backend, repeat)
+    finally:
+        ai_models.set_llm_backend(None)
+
+    summary = results.groupby(['Cenario', 'Execucao'], sort=False).agg(
+        Execucoes=('Total_s', 'count'),
+        Total_s=('Total_s', 'mean'),
+        Latencia_LLM_s=('Latencia_LLM_s', 'mean'),
+        Overhead_s=('Overhead_s', 'mean')
+    ).round(4)
+    print(summary.to_string())
+
+    governor_metrics = governor.metrics()
+    print(f"\nGovernador LLM: {governor_metrics['submitted']} chamadas, "
+          f"fila maxima {governor_metrics['max_queue_depth']}, "
+          f"espera media {governor_metrics['avg_wait_seconds']:.4f}s")
+
+    if args.mode == 'replay' and backend.misses:
+        print(f'\nAviso: {backend.misses} chamadas sem resposta gravada; grave novamente com "record".')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Offline checks for LLMGovernor and GovernedBackend.
+
+Runs against a ReplayBackend and a fake clock, so no network access or real
+waiting is needed:
+    python check_llm_governor.py
+
+Covers priority ordering, the token-bucket rate, LLMQueueFull, the interactive
+queue timeout and the retry after ResourceExhausted.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from google.api_core.exceptions import ResourceExhausted
+
+import llm_backends
+from llm_backends import (
+    BACKGROUND,
+    INTERACTIVE,
+    GovernedBackend,
+    LLMGovernor,
+    LLMQueueFull,
+    ReplayBackend,
+    llm_priority,
+    prompt_key
+)
+
+PROMPT = 'Qual é o produto mais vendido?'
+RESPONSE = 'Produto A'
+
+class FakeClock:
+    """Manually advanced monotonic clock; sleep() advances it instead of blocking"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+class FlakyBackend:
+    """Raise ResourceExhausted for the first calls, then defer to another backend"""
+
+    def __init__(self, inner, failures):
+        self.inner = inner
+        self.failures = failures
+        self.calls = 0
+
+    def generate(self, prompt, stop=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ResourceExhausted('quota')
+        return self.inner.generate(prompt, stop=stop)
+
+def make_replay_backend(directory):
+    """ReplayBackend serving RESPONSE for PROMPT with no simulated latency"""
+    path = os.path.join(directory, 'recording.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({prompt_key(PROMPT): {'response': RESPONSE, 'latency': 0.0, 'prompt_chars': len(PROMPT)}}, f)
+    return ReplayBackend(path, latency=0.0)
+
+def make_governor(clock, **limits):
+    """Governor whose rate limit never gets in the way unless asked to"""
+    limits.setdefault('requests_per_minute', 6e6)
+    limits.setdefault('burst', 1000)
+    return LLMGovernor(clock=clock, **limits)
+
+def wait_until(predicate, timeout=5.0):
+    """Poll until predicate() holds; fails the check after timeout real seconds"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out waiting for the governor'
+        time.sleep(0.005)
+
+def start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+def check_priority_order():
+    """Queued interactive calls start before background calls queued earlier"""
+    clock = FakeClock()
+    governor = make_governor(clock, max_concurrency=1)
+    started = []
+
+    def call(priority, name):
+        with governor.slot(priority):
+            started.append(name)
+
+    governor.acquire(INTERACTIVE)
+    threads = [start(lambda: call(BACKGROUND, 'background'))]
+    wait_until(lambda: governor.metrics()['queue_depth'] == 1)
+    threads.append(start(lambda: call(INTERACTIVE, 'interactive')))
+    wait_until(lambda: governor.metrics()['queue_depth'] == 2)
+
+    governor.release()
+    for thread in threads:
+        thread.join(5)
+    assert started == ['interactive', 'background'], started
+
+def check_token_bucket_rate():
+    """After the burst, calls start at the configured rate of the fake clock"""
+    clock = FakeClock()
+    governor = make_governor(clock, requests_per_minute=60, burst=2)
+    for _ in range(2):
+        governor.acquire()
+        governor.release()
+
+    thread = start(lambda: (governor.acquire(), governor.release()))
+    wait_until(lambda: governor.metrics()['queue_depth'] == 1)
+
+    clock.advance(0.5)
+    governor.reconfigure()  # wake the waiter so it re-reads the clock
+    time.sleep(0.05)
+    assert governor.metrics()['queue_depth'] == 1, 'started before a token was refilled'
+
+    clock.advance(0.5)
+    governor.reconfigure()
+    thread.join(5)
+    assert governor.metrics()['completed'] == 3
+
+def check_queue_full():
+    """A call arriving at a full queue is rejected instead of waiting"""
+    clock = FakeClock()
+    governor = make_governor(clock, max_concurrency=1, max_queue=1)
+    governor.acquire()
+    thread = start(lambda: (governor.acquire(), governor.release()))
+    wait_until(lambda: governor.metrics()['queue_depth'] == 1)
+
+    try:
+        governor.acquire()
+    except LLMQueueFull:
+        pass
+    else:
+        raise AssertionError('LLMQueueFull was not raised')
+    assert governor.metrics()['rejected'] == 1
+
+    governor.release()
+    thread.join(5)
+
+def check_interactive_timeout(directory):
+    """Interactive calls give up after LLM_QUEUE_TIMEOUT; background calls keep waiting"""
+    clock = FakeClock()
+    governor = make_governor(clock, max_concurrency=1)
+    backend = GovernedBackend(make_replay_backend(directory), governor)
+    outcomes = {}
+
+    def call(name, priority):
+        with llm_priority(priority):
+            try:
+                outcomes[name] = backend.generate(PROMPT)
+            except TimeoutError as e:
+                outcomes[name] = e
+
+    governor.acquire()
+    threads = [start(lambda: call('interactive', INTERACTIVE)), start(lambda: call('background', BACKGROUND))]
+    wait_until(lambda: governor.metrics()['queue_depth'] == 2)
+
+    clock.advance(llm_backends.LLM_QUEUE_TIMEOUT)
+    governor.reconfigure()
+    threads[0].join(5)
+    assert isinstance(outcomes.get('interactive'), TimeoutError), outcomes
+    assert 'background' not in outcomes
+
+    governor.release()
+    threads[1].join(5)
+    assert outcomes['background'] == RESPONSE
+    assert governor.metrics()['timed_out'] == 1
+
+def check_quota_retry(directory):
+    """ResourceExhausted is retried with backoff up to max_retries, then raised"""
+    clock = FakeClock()
+    real_sleep = llm_backends.time.sleep
+    llm_backends.time.sleep = clock.sleep
+    try:
+        flaky = FlakyBackend(make_replay_backend(directory), failures=2)
+        backend = GovernedBackend(flaky, make_governor(clock), max_retries=2)
+        assert backend.generate(PROMPT) == RESPONSE
+        backoff = [seconds for seconds in clock.sleeps if seconds]  # the replay itself sleeps 0s
+        assert flaky.calls == 3 and backoff == [1, 2], (flaky.calls, clock.sleeps)
+
+        flaky = FlakyBackend(make_replay_backend(directory), failures=3)
+        backend = GovernedBackend(flaky, make_governor(clock), max_retries=2)
+        try:
+            backend.generate(PROMPT)
+        except ResourceExhausted:
+            pass
+        else:
+            raise AssertionError('ResourceExhausted was not raised after the last retry')
+        assert flaky.calls == 3
+        assert backend.governor.metrics()['in_flight'] == 0
+    finally:
+        llm_backends.time.sleep = real_sleep
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        checks = [
+            ('prioridade', check_priority_order),
+            ('taxa do token bucket', check_token_bucket_rate),
+            ('fila cheia', check_queue_full),
+            ('timeout interativo', lambda: check_interactive_timeout(directory)),
+            ('retry apos ResourceExhausted', lambda: check_quota_retry(directory))
+        ]
+        for name, check in checks:
+            check()
+            print(f'OK  {name}')
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,24 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import threading
+import weakref
+from types import MappingProxyType
 from datetime import datetime
 import streamlit as st
 
+# Cached frames and derived tables are shared by reference (see preprocess_data and
+# get_derived), so writes through any copy must never reach them: copy-on-write is
+# always on from pandas 3 and has to be switched on explicitly before that
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Fingerprints memoised per live DataFrame object (id -> (weakref, fingerprint))
+_fingerprint_memo = {}
+
+# Registered derived tables: name -> (builder, dependency names)
+_derived_tables = {}
+
 @st.cache_data
 def load_data():
     """Load and cache the Amazon sales dataset"""
@@ -13,7 +29,10 @@ def load_data():
         st.error(f"Error loading data: {e}")
         return None
 
-@st.cache_data
+# A resource cache hands every rerun the same frame, so its fingerprint (and every
+# fingerprint-keyed cache) is computed once per dataset instead of once per rerun.
+# The frame is shared by all sessions: pages derive new frames instead of editing it.
+@st.cache_resource(show_spinner=False)
 def preprocess_data(df):
     """Clean and preprocess the dataset"""
     df = df.copy()
@@ -42,13 +61,26 @@ def preprocess_data(df):
     
     return df
 
-def get_summary_metrics(df):
-    """Calculate key business metrics"""
+def get_data_fingerprint(df):
+    """Return a short, stable hash identifying the dataset contents"""
+    memo = _fingerprint_memo.get(id(df))
+    if memo is not None and memo[0]() is df:
+        return memo[1]
+    
+    row_hashes = pd.util.hash_pandas_object(df, index=True).values
+    fingerprint = hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+    
+    key = id(df)
+    _fingerprint_memo[key] = (weakref.ref(df, lambda _: _fingerprint_memo.pop(key, None)), fingerprint)
+    return fingerprint
+
+def get_summary_metrics(df, distinct=None):
+    """Calculate key business metrics (distinct: 'exact', 'approx' or 'auto' counts)"""
     total_revenue = df['TotalAmount'].sum()
     total_orders = len(df)
     avg_order_value = df['TotalAmount'].mean()
-    total_customers = df['CustomerID'].nunique()
-    total_products = df['ProductID'].nunique()
+    total_customers = count_distinct(df, 'CustomerID', distinct)
+    total_products = count_distinct(df, 'ProductID', distinct)
     
     # Status breakdown
     delivered_orders = len(df[df['OrderStatus'] == 'Delivered'])
@@ -105,16 +137,22 @@ def filter_data(df, date_range=None, categories=None, countries=None, status=Non
     
     return filtered_df
 
-def get_top_products(df, n=20, metric='revenue'):
-    """Get top N products by specified metric"""
-    if metric == 'revenue':
-        top = df.groupby('ProductName')['TotalAmount'].sum().nlargest(n)
-    elif metric == 'quantity':
-        top = df.groupby('ProductName')['Quantity'].sum().nlargest(n)
-    elif metric == 'orders':
-        top = df.groupby('ProductName').size().nlargest(n)
+def get_top_products(df, n=20, metric='revenue', category=None):
+    """Get top N products by specified metric, optionally within one category"""
+    totals = get_derived(df, 'product_name_totals')
+    ranking = get_derived(df, 'product_rankings')[metric]
+    if category is None:
+        totals, order = totals['all'], ranking['all']
+    else:
+        totals = totals['by_category']
+        order = ranking['by_category'].get(category, np.array([], dtype=np.intp))
     
-    return top.reset_index()
+    # Rankings are presorted, so any n is a slice
+    top = totals.iloc[order[:n]]
+    return pd.DataFrame({
+        'ProductName': top['ProductName'].to_numpy(),
+        TOP_PRODUCT_COLUMNS[metric]: top[PRODUCT_RANK_METRICS[metric]].to_numpy()
+    })
 
 def get_category_performance(df):
     """Analyze performance by category"""
@@ -193,13 +231,794 @@ def get_time_series_data(df, frequency='D'):
 
 def get_geographic_summary(df):
     """Summarize sales by geographic location"""
-    country_stats = df.groupby('Country').agg({
-        'TotalAmount': 'sum',
-        'OrderID': 'count',
-        'ShippingCost': 'mean'
+    country_stats = get_geo_summary(df, 'Country')[['Receita', 'Pedidos', 'Frete_Medio']]
+    country_stats.columns = ['Revenue', 'Orders', 'Avg_Shipping_Cost']
+    return country_stats
+
+def get_seller_performance(df):
+    """Seller scorecard for any slice of orders, best sellers first (uncached)"""
+    return build_seller_scorecard(df[df['OrderStatus'] == 'Delivered'])
+
+def get_commercial_opportunities(df, metrics):
+    """Estimate revenue opportunities from conversion, margin and loss recovery"""
+    delivered_revenue = df[df['OrderStatus'] == 'Delivered']['TotalAmount'].sum()
+    lost_revenue = df[df['OrderStatus'].isin(['Cancelled', 'Returned'])]['TotalAmount'].sum()
+    current_conversion = metrics['conversion_rate']
+    
+    # Opportunities
+    if current_conversion > 0:
+        opportunity_conversion = (delivered_revenue / current_conversion) * (80 - current_conversion)
+    else:
+        opportunity_conversion = 0.0
+    opportunity_margin = delivered_revenue * 0.05  # 5% margin improvement
+    opportunity_retention = lost_revenue * 0.3  # 30% de recuperação
+    
+    return {
+        'delivered_revenue': delivered_revenue,
+        'lost_revenue': lost_revenue,
+        'opportunity_conversion': opportunity_conversion,
+        'opportunity_margin': opportunity_margin,
+        'opportunity_retention': opportunity_retention,
+        'total_opportunity': opportunity_conversion + opportunity_margin + opportunity_retention
+    }
+
+def get_action_plan_report_inputs(df, metrics):
+    """Build the metrics and quick wins rendered in the action plan PDF"""
+    opportunities = get_commercial_opportunities(df, metrics)
+    total_revenue = df['TotalAmount'].sum()
+    current_conversion = metrics['conversion_rate']
+    
+    margin_pct = (df['Net_Revenue'].sum() / total_revenue) * 100 if total_revenue else 0.0
+    roi_projected = ((opportunities['total_opportunity'] * 0.7) / 33000) * 100
+    
+    pdf_metrics = {
+        'delivered_revenue': opportunities['delivered_revenue'],
+        'avg_order_value': metrics['avg_order_value'],
+        'conversion_rate': current_conversion,
+        'margin_pct': margin_pct,
+        'lost_revenue': opportunities['lost_revenue'],
+        'roi_projected': roi_projected
+    }
+    
+    quick_wins = [
+        {
+            'title': 'Aumentar Conversao',
+            'description': 'Implementar follow-up em 24h, confirmar pedidos pendentes, reduzir conversao de {:.1f}% para 77%'.format(current_conversion),
+            'gain': opportunities['opportunity_conversion'] * 0.3
+        },
+        {
+            'title': 'Otimizar Margem',
+            'description': 'Revisar politica de desconto, treinar equipe em valor, aumentar margem em +2%',
+            'gain': opportunities['opportunity_margin'] * 0.4
+        },
+        {
+            'title': 'Reduzir Perdas',
+            'description': 'Investigar cancelamentos, melhorar processo pos-venda, reduzir perdas em -20%',
+            'gain': opportunities['opportunity_retention'] * 0.5
+        }
+    ]
+    
+    return pdf_metrics, quick_wins
+
+# Scatter density: bins per axis and the most points a cell may hold to count as sparse
+DENSITY_BINS = 120
+DENSITY_SPARSE_COUNT = 2
+
+def _density_edges(values, bins):
+    """Bin edges for one axis; discrete axes get one bin per distinct value"""
+    unique = np.unique(values)
+    if len(unique) <= bins:
+        if len(unique) == 1:
+            return np.array([unique[0] - 0.5, unique[0] + 0.5])
+        midpoints = (unique[:-1] + unique[1:]) / 2
+        return np.concatenate([[2 * unique[0] - midpoints[0]], midpoints, [2 * unique[-1] - midpoints[-1]]])
+    return np.linspace(unique[0], unique[-1], bins + 1)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _compute_scatter_density(fingerprint, _df, x_col, y_col, group_col, bins, sparse_count):
+    """Cached body of get_scatter_density; keyed on the dataset fingerprint"""
+    data = _df[[x_col, y_col]].dropna()
+    x = data[x_col].to_numpy(dtype=float)
+    y = data[y_col].to_numpy(dtype=float)
+    
+    x_edges = _density_edges(x, bins)
+    y_edges = _density_edges(y, bins)
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    
+    # Points in near-empty cells are the ones a heatmap would hide
+    x_bin = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, len(x_edges) - 2)
+    y_bin = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, len(y_edges) - 2)
+    sparse = counts[x_bin, y_bin] <= sparse_count
+    
+    columns = [x_col, y_col] + ([group_col] if group_col else [])
+    outliers = _df.loc[data.index[sparse], columns]
+    
+    # OLS fit on every row (per group when requested)
+    trends = {}
+    groups = _df.loc[data.index].groupby(group_col, observed=True) if group_col else [('Todos', data)]
+    for name, group in groups:
+        if group[x_col].nunique() > 1:
+            slope, intercept = np.polyfit(group[x_col].to_numpy(dtype=float), group[y_col].to_numpy(dtype=float), 1)
+            trends[name] = (float(slope), float(intercept))
+    
+    return {
+        'x': (x_edges[:-1] + x_edges[1:]) / 2,
+        'y': (y_edges[:-1] + y_edges[1:]) / 2,
+        'counts': counts.T,  # rows follow y, as plotly heatmaps expect
+        'x_range': (float(x_edges[0]), float(x_edges[-1])),
+        'outliers': outliers,
+        'trends': trends,
+        'total_points': len(data)
+    }
+
+def get_scatter_density(df, x_col, y_col, group_col=None, bins=DENSITY_BINS, sparse_count=DENSITY_SPARSE_COUNT):
+    """2D histogram of every row, the isolated points in sparse cells and OLS trend lines"""
+    return _compute_scatter_density(get_data_fingerprint(df), df, x_col, y_col, group_col, bins, sparse_count)
+
+def derived_table(name, depends_on=()):
+    """Register a derived-table builder called as builder(df, *dependency_results)"""
+    def register(builder):
+        _derived_tables[name] = (builder, tuple(depends_on))
+        return builder
+    return register
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _derived_store(fingerprint):
+    """Derived tables already computed for one dataset version, shared by all sessions"""
+    return {'lock': threading.RLock(), 'tables': {}}
+
+def _resolve_derived(df, name, tables, path=()):
+    """Compute a derived table after its dependencies, reusing anything already built"""
+    if name in tables:
+        return tables[name]
+    if name in path:
+        raise ValueError(f"Circular dependency between derived tables: {' -> '.join(path + (name,))}")
+    if name not in _derived_tables:
+        raise KeyError(f"Unknown derived table: {name}")
+    
+    builder, depends_on = _derived_tables[name]
+    inputs = [_resolve_derived(df, dependency, tables, path + (name,)) for dependency in depends_on]
+    tables[name] = _freeze(builder(df, *inputs))
+    return tables[name]
+
+def _freeze(value):
+    """Make arrays and dicts of a shared derived table unwritable"""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        value = MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+def get_derived(df, name):
+    """Return a registered derived table, built once per dataset version.
+    
+    Results are shared across pages and sessions: arrays are read-only, dicts are
+    read-only mappings and pandas objects come back as copy-on-write shallow copies.
+    """
+    store = _derived_store(get_data_fingerprint(df))
+    with store['lock']:
+        table = _resolve_derived(df, name, store['tables'])
+    if isinstance(table, (pd.DataFrame, pd.Series)):
+        return table.copy(deep=False)
+    return table
+
+# Order status tensor: orders and revenue for every status x category x payment x month cell
+STATUS_TENSOR_DIMS = ['OrderStatus', 'Category', 'PaymentMethod', 'OrderMonth']
+STATUS_RATE_COLUMNS = {'Delivered': 'Taxa_Entrega_%', 'Cancelled': 'Taxa_Cancelamento_%', 'Returned': 'Taxa_Devolucao_%'}
+
+@derived_table('status_tensor')
+def _status_tensor(df):
+    axes = {}
+    codes = []
+    for dim in STATUS_TENSOR_DIMS:
+        values = df['OrderDate'].dt.to_period('M') if dim == 'OrderMonth' else df[dim]
+        dim_codes, uniques = pd.factorize(values, sort=True)
+        axes[dim] = pd.Index(uniques, name=dim)
+        codes.append(dim_codes)
+    
+    # Rows with a missing key (code -1) stay out of the tensor
+    valid = np.all(np.stack(codes) >= 0, axis=0)
+    shape = tuple(len(axis) for axis in axes.values())
+    cells = np.ravel_multi_index([dim_codes[valid] for dim_codes in codes], shape)
+    size = int(np.prod(shape))
+    revenue = df['TotalAmount'].to_numpy(dtype=float)[valid]
+    
+    return {
+        'axes': axes,
+        'orders': np.bincount(cells, minlength=size).reshape(shape),
+        'revenue': np.bincount(cells, weights=revenue, minlength=size).reshape(shape)
+    }
+
+def _status_table(tensor, by=None, value='orders', filters=None):
+    """Sum a tensor slice down to statuses (Series) or by-dimensions x statuses (DataFrame)"""
+    by = [] if by is None else [by] if isinstance(by, str) else list(by)
+    filters = filters or {}
+    dims = list(tensor['axes'])
+    for dim in [*by, *filters]:
+        if dim not in dims or dim in by and dim == 'OrderStatus':
+            raise KeyError(f"Unknown status tensor dimension: {dim}")
+    
+    selection = []
+    for dim, axis in tensor['axes'].items():
+        if dim in filters:
+            wanted = filters[dim]
+            if not isinstance(wanted, (list, tuple, set, np.ndarray, pd.Index)):
+                wanted = [wanted]
+            positions = axis.get_indexer(list(wanted))
+            selection.append(positions[positions >= 0])
+        else:
+            selection.append(np.arange(len(axis)))
+    
+    keep = [0] + [dims.index(dim) for dim in by]
+    cube = tensor[value][np.ix_(*selection)]
+    cube = cube.sum(axis=tuple(i for i in range(len(dims)) if i not in keep))
+    cube = cube.transpose([sorted(keep).index(i) for i in keep])
+    
+    statuses = tensor['axes']['OrderStatus'][selection[0]]
+    if not by:
+        return pd.Series(cube, index=statuses)
+    
+    levels = [tensor['axes'][dim][selection[dims.index(dim)]] for dim in by]
+    index = levels[0] if len(levels) == 1 else pd.MultiIndex.from_product(levels)
+    table = pd.DataFrame(cube.reshape(len(statuses), -1).T, index=index, columns=statuses)
+    return table[table.sum(axis=1) > 0]
+
+def get_status_counts(df, by=None, value='orders', **filters):
+    """Orders (or revenue with value='revenue') per status for any tensor slice.
+    
+    by keeps Category, PaymentMethod and/or OrderMonth as rows; filters restrict a
+    dimension to one value or a list, e.g. get_status_counts(df, by='Category', PaymentMethod='UPI').
+    """
+    return _status_table(get_derived(df, 'status_tensor'), by, value, filters)
+
+def get_status_rates(df, by=None, **filters):
+    """Orders, revenue, lost revenue and delivery/cancellation/return rates (%) for a slice"""
+    tensor = get_derived(df, 'status_tensor')
+    orders = _status_table(tensor, by, 'orders', filters)
+    revenue = _status_table(tensor, by, 'revenue', filters)
+    if by is None:
+        orders, revenue = orders.to_frame().T, revenue.to_frame().T
+    
+    total = orders.sum(axis=1)
+    rates = pd.DataFrame({'Pedidos': total, 'Faturamento': revenue.sum(axis=1).round(2)})
+    rates['Valor_Perdido'] = (revenue.get('Cancelled', 0) + revenue.get('Returned', 0)).round(2)
+    for status, column in STATUS_RATE_COLUMNS.items():
+        rates[column] = (orders.get(status, 0) / total * 100).round(2)
+    
+    return rates.iloc[0].rename(None) if by is None else rates
+
+@derived_table('status_counts', depends_on=('status_tensor',))
+def _status_counts(df, tensor):
+    return _status_table(tensor)
+
+@derived_table('delivered_orders')
+def _delivered_orders(df):
+    return df[df['OrderStatus'] == 'Delivered']
+
+@derived_table('category_totals', depends_on=('status_tensor',))
+def _category_totals(df, tensor):
+    return pd.DataFrame({
+        'Pedidos': _status_table(tensor, 'Category').sum(axis=1),
+        'Faturamento': _status_table(tensor, 'Category', 'revenue').sum(axis=1)
+    })
+
+@derived_table('cancelled_by_category', depends_on=('status_tensor', 'category_totals'))
+def _cancelled_by_category(df, tensor, category_totals):
+    cancelled = pd.DataFrame({
+        'Cancelamentos': _status_table(tensor, 'Category', filters={'OrderStatus': 'Cancelled'}).sum(axis=1),
+        'Valor_Perdido': _status_table(tensor, 'Category', 'revenue', {'OrderStatus': 'Cancelled'}).sum(axis=1).round(2)
+    })
+    cancelled['Taxa_%'] = ((cancelled['Cancelamentos'] / category_totals['Pedidos']) * 100).round(2)
+    return cancelled.sort_values('Valor_Perdido', ascending=False)
+
+@derived_table('product_facts')
+def _product_facts(df):
+    delivered = df['OrderStatus'] == 'Delivered'
+    facts = df.assign(
+        _delivered=delivered,
+        _delivered_revenue=df['TotalAmount'].where(delivered, 0),
+        _delivered_net=df['Net_Revenue'].where(delivered, 0)
+    ).groupby('ProductID').agg(
+        ProductName=('ProductName', 'first'),
+        Category=('Category', 'first'),
+        Brand=('Brand', 'first'),
+        Preco_Medio=('UnitPrice', 'mean'),
+        Pedidos=('OrderID', 'count'),
+        Quantidade=('Quantity', 'sum'),
+        Faturamento=('TotalAmount', 'sum'),
+        Vendas=('_delivered', 'sum'),
+        Faturamento_Entregue=('_delivered_revenue', 'sum'),
+        Margem_Liquida=('_delivered_net', 'sum')
+    ).round(2)
+    facts['Margem_%'] = (facts['Margem_Liquida'] / facts['Faturamento_Entregue'] * 100).round(2)
+    return facts
+
+@derived_table('product_index', depends_on=('product_facts',))
+def _product_index(df, facts):
+    """Sorted values and row order of every numeric product metric (NaN last)"""
+    index = {}
+    for column in facts.select_dtypes('number').columns:
+        values = facts[column].to_numpy(dtype=float)
+        order = np.argsort(values, kind='stable')
+        index[column] = (values[order], order)
+    return index
+
+# Product ranking metrics: get_top_products metric -> product fact column / output column
+PRODUCT_RANK_METRICS = {'revenue': 'Faturamento', 'quantity': 'Quantidade', 'orders': 'Pedidos'}
+TOP_PRODUCT_COLUMNS = {'revenue': 'TotalAmount', 'quantity': 'Quantity', 'orders': 'Orders'}
+
+@derived_table('product_name_totals', depends_on=('product_facts',))
+def _product_name_totals(df, facts):
+    """Ranking metrics summed per ProductName (one name can cover several ProductIDs), overall and per category"""
+    columns = list(PRODUCT_RANK_METRICS.values())
+    return {
+        'all': facts.groupby('ProductName', sort=False)[columns].sum().reset_index(),
+        'by_category': facts.groupby(['Category', 'ProductName'], sort=False)[columns].sum().reset_index()
+    }
+
+@derived_table('product_rankings', depends_on=('product_name_totals',))
+def _product_rankings(df, totals):
+    """Product name totals in descending order of each ranking metric, overall and per category"""
+    category_codes, categories = pd.factorize(totals['by_category']['Category'])
+    rankings = {}
+    for metric, column in PRODUCT_RANK_METRICS.items():
+        order = np.argsort(-totals['all'][column].to_numpy(dtype=float), kind='stable')
+        category_order = np.argsort(-totals['by_category'][column].to_numpy(dtype=float), kind='stable')
+        rankings[metric] = {
+            'all': order,
+            'by_category': {
+                category: category_order[category_codes[category_order] == code]
+                for code, category in enumerate(categories)
+            }
+        }
+    return rankings
+
+def get_product_facts(df):
+    """One row per ProductID: all-order revenue/units/orders, delivered sales, net revenue and margin"""
+    return get_derived(df, 'product_facts')
+
+def screen_products(df, where=None, sort_by='Faturamento', top_k=None, ascending=False):
+    """Products whose metrics fall inside inclusive bounds, ranked by sort_by.
+    
+    where maps a metric to (low, high), None leaving that side open, e.g.
+    screen_products(df, {'Vendas': (30, None), 'Margem_%': (None, 85)}, top_k=5).
+    """
+    facts = get_derived(df, 'product_facts')
+    index = get_derived(df, 'product_index')
+    
+    mask = np.ones(len(facts), dtype=bool)
+    for column, (low, high) in (where or {}).items():
+        values, order = index[column]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        stop = np.searchsorted(values, np.inf if high is None else high, side='right')
+        hits = np.zeros(len(facts), dtype=bool)
+        hits[order[start:stop]] = True
+        mask &= hits
+    
+    values, order = index[sort_by]
+    ranked = np.searchsorted(values, np.inf, side='right')
+    ranked = np.concatenate([order[:ranked] if ascending else order[:ranked][::-1], order[ranked:]])
+    selected = ranked[mask[ranked]]
+    if top_k is not None:
+        selected = selected[:top_k]
+    
+    return facts.iloc[selected]
+
+@derived_table('payment_status_matrix', depends_on=('status_tensor',))
+def _payment_status_matrix(df, tensor):
+    payments = _status_table(tensor, 'PaymentMethod')
+    payments['Total'] = payments.sum(axis=1)
+    payments['Taxa_Entrega_%'] = (payments.get('Delivered', 0) / payments['Total'] * 100).round(2)
+    return payments.sort_values('Taxa_Entrega_%', ascending=False)
+
+# Distinct counts: 'exact' (nunique / merged sets), 'approx' (HyperLogLog sketches) or
+# 'auto', which stays exact up to DISTINCT_EXACT_MAX_ROWS orders
+DISTINCT_COUNT_MODE = 'auto'
+DISTINCT_EXACT_MAX_ROWS = 1_000_000
+HLL_PRECISION = 12  # 4096 one-byte registers per sketch, ~1.6% standard error
+
+def resolve_distinct_mode(df, mode=None):
+    """Concrete 'exact' or 'approx' mode for distinct counts over df"""
+    mode = mode or DISTINCT_COUNT_MODE
+    if mode == 'auto':
+        return 'exact' if len(df) <= DISTINCT_EXACT_MAX_ROWS else 'approx'
+    if mode not in ('exact', 'approx'):
+        raise ValueError(f"Unknown distinct count mode: {mode}")
+    return mode
+
+def _bit_length(values):
+    """Exact bit length of every uint64 value"""
+    values = values.copy()
+    lengths = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = values >= np.uint64(1 << shift)
+        lengths[wide] += shift
+        values[wide] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+def hll_sketches(values, groups=None, group_count=1, precision=HLL_PRECISION):
+    """HyperLogLog registers (group_count x 2**precision) of values, one sketch per group code"""
+    hashes = pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+    buckets = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest_bits = 64 - precision
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    ranks = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+    
+    groups = np.zeros(len(hashes), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    valid = groups >= 0
+    registers = np.zeros((group_count, 1 << precision), dtype=np.uint8)
+    np.maximum.at(registers, (groups[valid], buckets[valid]), ranks[valid])
+    return registers
+
+def merge_hll_sketches(registers, groups, group_count):
+    """Union sketches row-wise into group_count sketches (negative group codes are skipped)"""
+    groups = np.asarray(groups, dtype=np.int64)
+    merged = np.zeros((group_count, registers.shape[1]), dtype=np.uint8)
+    np.maximum.at(merged, groups[groups >= 0], registers[groups >= 0])
+    return merged
+
+def hll_estimate(registers):
+    """Distinct-count estimate of every sketch row"""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(float)), axis=1)
+    
+    # Linear counting is more accurate while many registers are still empty
+    empty = np.sum(registers == 0, axis=1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(empty, 1))
+    estimate = np.where((raw <= 2.5 * m) & (empty > 0), linear, raw)
+    return np.rint(estimate).astype(np.int64)
+
+def count_distinct(df, column, mode=None):
+    """Distinct values of a column, exact or estimated from a HyperLogLog sketch"""
+    if resolve_distinct_mode(df, mode) == 'exact':
+        return int(df[column].nunique())
+    values = df[column].dropna()
+    return int(hll_estimate(hll_sketches(values))[0]) if len(values) else 0
+
+# Geographic hierarchy: additive measures per Country > State > City > delivered cell, plus
+# each cell's distinct customers as (cell, customer) pairs (exact) or HLL sketches (approx)
+GEO_LEVELS = ['Country', 'State', 'City']
+# Index keys of each roll-up; 'CityName' merges cities that share a name across states/countries
+GEO_ROLLUP_KEYS = {
+    'Country': ['Country'],
+    'State': ['Country', 'State'],
+    'City': ['Country', 'State', 'City'],
+    'CityName': ['City']
+}
+
+@derived_table('geo_cells')
+def _geo_cells(df):
+    keys = [df[level] for level in GEO_LEVELS] + [(df['OrderStatus'] == 'Delivered').rename('Entregue')]
+    grouped = df.groupby(keys, sort=True)
+    cells = grouped.agg(
+        Receita=('TotalAmount', 'sum'),
+        Pedidos=('OrderID', 'count'),
+        Itens=('Quantity', 'sum'),
+        Frete_Total=('ShippingCost', 'sum'),
+        Desconto_Total=('Discount', 'sum')
+    )
+    return {'cells': cells, 'cell_of_row': grouped.ngroup().to_numpy()}
+
+@derived_table('geo_customer_pairs', depends_on=('geo_cells',))
+def _geo_customer_pairs(df, geo):
+    customer_codes, customers = pd.factorize(df['CustomerID'])
+    customer_count = max(len(customers), 1)
+    valid = (geo['cell_of_row'] >= 0) & (customer_codes >= 0)
+    pairs = np.unique(geo['cell_of_row'][valid].astype(np.int64) * customer_count + customer_codes[valid])
+    return {'cells': pairs // customer_count, 'customers': pairs % customer_count, 'customer_count': customer_count}
+
+@derived_table('geo_customer_sketches', depends_on=('geo_cells',))
+def _geo_customer_sketches(df, geo):
+    groups = np.where(df['CustomerID'].notna(), geo['cell_of_row'], -1)
+    return hll_sketches(df['CustomerID'], groups, len(geo['cells']))
+
+def _geo_rollups(geo, count_customers):
+    """Every level's roll-up, for all and delivered-only orders"""
+    cells = geo['cells']
+    delivered = np.asarray(cells.index.get_level_values('Entregue'), dtype=bool)
+    rollups = {}
+    for level, keys in GEO_ROLLUP_KEYS.items():
+        for delivered_only in (False, True):
+            included = delivered if delivered_only else np.ones(len(cells), dtype=bool)
+            grouped = cells[included].groupby(level=keys, sort=True)
+            rollup = grouped.sum()
+            group_of_cell = np.full(len(cells), -1, dtype=np.int64)
+            group_of_cell[included] = grouped.ngroup().to_numpy()
+            
+            summary = pd.DataFrame({
+                'Receita': rollup['Receita'],
+                'Pedidos': rollup['Pedidos'],
+                'Itens': rollup['Itens'],
+                'Ticket_Medio': rollup['Receita'] / rollup['Pedidos'],
+                'Frete_Medio': rollup['Frete_Total'] / rollup['Pedidos'],
+                'Desconto_Medio': rollup['Desconto_Total'] / rollup['Pedidos'],
+                'Clientes': count_customers(group_of_cell, len(rollup))
+            }, index=rollup.index).round(2)
+            if 'Country' not in keys:
+                # Country contributing the most revenue to each merged group
+                by_country = cells[included].groupby(level=keys + ['Country'], sort=True)['Receita'].sum()
+                summary['Country'] = by_country.groupby(level=keys).idxmax().str[-1]
+            rollups[(level, delivered_only)] = summary.sort_values('Receita', ascending=False)
+    return rollups
+
+@derived_table('geo_rollups_exact', depends_on=('geo_cells', 'geo_customer_pairs'))
+def _geo_rollups_exact(df, geo, pairs):
+    def count_customers(group_of_cell, group_count):
+        # A customer counts once per group however many of its cells they bought in
+        pair_groups = group_of_cell[pairs['cells']]
+        kept = pair_groups >= 0
+        merged = np.unique(pair_groups[kept] * pairs['customer_count'] + pairs['customers'][kept])
+        return np.bincount(merged // pairs['customer_count'], minlength=group_count)
+    return _geo_rollups(geo, count_customers)
+
+@derived_table('geo_rollups_approx', depends_on=('geo_cells', 'geo_customer_sketches'))
+def _geo_rollups_approx(df, geo, sketches):
+    def count_customers(group_of_cell, group_count):
+        return hll_estimate(merge_hll_sketches(sketches, group_of_cell, group_count))
+    return _geo_rollups(geo, count_customers)
+
+def get_geo_summary(df, level='Country', delivered_only=False, distinct=None, **filters):
+    """Revenue, orders, units, averages and distinct customers per Country, State or City.
+    
+    Rows are indexed by the hierarchy down to level; filters on parent levels drill
+    down, e.g. get_geo_summary(df, 'City', Country='India'). level='CityName' groups
+    by city name alone, with the city's main Country as a column. distinct picks exact
+    or approximate customer counts (see DISTINCT_COUNT_MODE).
+    """
+    rollups = get_derived(df, f'geo_rollups_{resolve_distinct_mode(df, distinct)}')
+    summary = rollups[(level, delivered_only)]
+    for dim, value in filters.items():
+        summary = summary[summary.index.get_level_values(dim) == value]
+    return summary.copy()
+
+# Discount bands: right-closed intervals over Discount, the first one also holding its lower edge
+DEFAULT_DISCOUNT_BANDS = ((0, 0.05, 0.10, 0.15, 0.20, 1.0), ('0-5%', '5-10%', '10-15%', '15-20%', '>20%'))
+
+def make_discount_bands(edges, labels=None):
+    """Build a hashable discount band scheme from increasing edges (fractions)"""
+    edges = tuple(float(edge) for edge in edges)
+    if len(edges) < 2 or any(low >= high for low, high in zip(edges, edges[1:])):
+        raise ValueError("Discount band edges must be at least two increasing values")
+    if labels is None:
+        labels = tuple(f'{low * 100:g}-{high * 100:g}%' for low, high in zip(edges, edges[1:]))
+    elif len(labels) != len(edges) - 1:
+        raise ValueError("Discount bands need one label per interval")
+    return edges, tuple(labels)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _discount_band_codes(fingerprint, _df, edges):
+    """Band index of every order (-1 outside the scheme), computed once per scheme"""
+    discount = _df['Discount'].to_numpy(dtype=float)
+    codes = np.searchsorted(np.asarray(edges), discount, side='left') - 1
+    codes[discount == edges[0]] = 0
+    codes[(codes >= len(edges) - 1) | np.isnan(discount)] = -1
+    return codes.astype(np.int8)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _compute_discount_bands(fingerprint, _df, bands, by):
+    edges, labels = bands
+    codes = _discount_band_codes(fingerprint, _df, edges)
+    valid = codes >= 0
+    band_count = len(labels)
+    
+    if by is None:
+        keys = codes[valid].astype(np.int64)
+        groups = pd.Index([], dtype=object)
+        group_count = 1
+    else:
+        group_codes, groups = pd.factorize(_df[by], sort=True)
+        valid &= group_codes >= 0
+        keys = group_codes[valid].astype(np.int64) * band_count + codes[valid]
+        group_count = len(groups)
+    
+    size = group_count * band_count
+    orders = np.bincount(keys, minlength=size)
+    revenue = np.bincount(keys, weights=_df['TotalAmount'].to_numpy(dtype=float)[valid], minlength=size)
+    net_revenue = np.bincount(keys, weights=_df['Net_Revenue'].to_numpy(dtype=float)[valid], minlength=size)
+    
+    band_labels = pd.CategoricalIndex(labels, categories=labels, ordered=True, name='Faixa_Desconto')
+    if by is None:
+        index = band_labels
+    else:
+        index = pd.MultiIndex.from_product([groups.rename(by), band_labels])
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary = pd.DataFrame({
+            'Faturamento': revenue.round(2),
+            'Ticket_Medio': (revenue / orders).round(2),
+            'Vendas': orders,
+            'Margem': net_revenue.round(2),
+            'Margem_%': (net_revenue / revenue * 100).round(1)
+        }, index=index)
+    
+    return summary[summary['Vendas'] > 0]
+
+def get_discount_band_summary(df, bands=DEFAULT_DISCOUNT_BANDS, by=None):
+    """Revenue, ticket, orders, net revenue and margin per discount band (or per by x band)"""
+    return _compute_discount_bands(get_data_fingerprint(df), df, make_discount_bands(*bands), by)
+
+# Seller analytics: metrics ranked into percentiles (higher value -> higher percentile)
+SELLER_PERCENTILE_COLUMNS = ['Faturamento', 'Ticket_Medio', 'Margem_%', 'Itens', 'Desc_Medio']
+
+def build_seller_scorecard(delivered):
+    """Per-seller totals and rank percentiles for already filtered delivered orders"""
+    scorecard = delivered.groupby('SellerID').agg({
+        'TotalAmount': ['sum', 'mean', 'count'],
+        'Quantity': 'sum',
+        'Discount': 'mean',
+        'Net_Revenue': 'sum'
     }).round(2)
     
-    country_stats.columns = ['Revenue', 'Orders', 'Avg_Shipping_Cost']
-    country_stats = country_stats.sort_values('Revenue', ascending=False)
+    scorecard.columns = ['Faturamento', 'Ticket_Medio', 'Vendas', 'Itens', 'Desc_Medio', 'Margem_Liquida']
+    scorecard['Margem_%'] = (scorecard['Margem_Liquida'] / scorecard['Faturamento'] * 100).round(1)
+    scorecard = scorecard.sort_values('Faturamento', ascending=False)
     
-    return country_stats
+    scorecard['Ranking'] = np.arange(1, len(scorecard) + 1)
+    for column in SELLER_PERCENTILE_COLUMNS:
+        scorecard[f'Percentil_{column}'] = (scorecard[column].rank(pct=True) * 100).round(1)
+    
+    return scorecard
+
+@derived_table('seller_scorecard', depends_on=('delivered_orders',))
+def _seller_scorecard(df, delivered):
+    return build_seller_scorecard(delivered)
+
+def get_seller_scorecard(df):
+    """Seller scorecard built once per dataset version (read-only)"""
+    return get_derived(df, 'seller_scorecard')
+
+def get_top_sellers(scorecard, n=10, by='Faturamento'):
+    """Top n sellers of a scorecard by any metric"""
+    if by == 'Faturamento':
+        return scorecard.head(n)  # already ranked by revenue
+    return scorecard.nlargest(n, by)
+
+def get_seller_percentile(scorecard, value, column='Faturamento'):
+    """Percentage of sellers whose metric is below value"""
+    values = np.sort(scorecard[column].to_numpy())
+    if len(values) == 0:
+        return 0.0
+    return float(np.searchsorted(values, value, side='left') / len(values) * 100)
+
+def get_seller_value_at_percentile(scorecard, percentile, column='Faturamento'):
+    """Metric value at a given percentile (0-100) of the sellers"""
+    if len(scorecard) == 0:
+        return 0.0
+    return float(scorecard[column].quantile(percentile / 100))
+
+# Cohorts: customers grouped by first-purchase month, activity tracked in months since then.
+# Months are integer indexes (year * 12 + month - 1) so offsets are plain subtraction.
+def _month_index(dates):
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.int64)
+
+def empty_cohorts():
+    """Cohort state before any orders"""
+    return {
+        'customers': pd.Index([], dtype=object),
+        'first_month': np.array([], dtype=np.int64),
+        'base_month': None,
+        'last_month': None,
+        'active': np.zeros((0, 0), dtype=np.int64),
+        'revenue': np.zeros((0, 0))
+    }
+
+def update_cohorts(state, orders):
+    """New cohort state with orders from months after state['last_month'] added.
+    
+    Only the new orders are scanned: earlier customers keep their cohort and the
+    cohort x offset matrices grow by the new months.
+    """
+    orders = orders[orders['CustomerID'].notna()]
+    if len(orders) == 0:
+        return state
+    months = _month_index(orders['OrderDate'])
+    if state['last_month'] is not None and months.min() <= state['last_month']:
+        raise ValueError("Cohort updates must only contain months after the last one loaded; "
+                         "rebuild with build_cohorts instead")
+    
+    new_customers = pd.Index(orders['CustomerID'].unique()).difference(state['customers'], sort=False)
+    customers = state['customers'].append(new_customers)
+    codes = customers.get_indexer(orders['CustomerID'])
+    first_month = np.concatenate([state['first_month'], np.full(len(new_customers), np.iinfo(np.int64).max)])
+    np.minimum.at(first_month, codes, months)
+    
+    base_month = months.min() if state['base_month'] is None else state['base_month']
+    last_month = months.max()
+    size = last_month - base_month + 1
+    
+    # One activity per customer and month, with that month's revenue
+    pairs, pair_of_order = np.unique(codes * size + (months - base_month), return_inverse=True)
+    pair_revenue = np.bincount(pair_of_order.ravel(), weights=orders['TotalAmount'].to_numpy(dtype=float))
+    pair_customers = pairs // size
+    cohorts = first_month[pair_customers] - base_month
+    offsets = pairs % size + base_month - first_month[pair_customers]
+    cells = cohorts * size + offsets
+    
+    active = np.zeros((size, size), dtype=np.int64)
+    revenue = np.zeros((size, size))
+    previous = state['active'].shape[0]
+    active[:previous, :previous] = state['active']
+    revenue[:previous, :previous] = state['revenue']
+    active += np.bincount(cells, minlength=size * size).reshape(size, size)
+    revenue += np.bincount(cells, weights=pair_revenue, minlength=size * size).reshape(size, size)
+    
+    return {
+        'customers': customers,
+        'first_month': first_month,
+        'base_month': base_month,
+        'last_month': last_month,
+        'active': active,
+        'revenue': revenue
+    }
+
+def build_cohorts(df):
+    """Cohort state for a full order history"""
+    return update_cohorts(empty_cohorts(), df)
+
+@st.cache_resource(show_spinner=False)
+def _cohort_history():
+    """Last cohort state built, with a digest of the orders it covers, shared by all sessions"""
+    return {'lock': threading.Lock(), 'state': None, 'digest': None}
+
+def _orders_digest(row_hashes):
+    """Order-insensitive digest of a set of order rows"""
+    return hashlib.sha256(np.sort(row_hashes).tobytes()).hexdigest()
+
+@derived_table('cohorts')
+def _cohorts(df):
+    # A new dataset version whose orders up to the last loaded month are unchanged
+    # (e.g. a file that grew by new months) only adds the new months to the last state
+    orders = df[df['CustomerID'].notna()]
+    months = _month_index(orders['OrderDate'])
+    row_hashes = pd.util.hash_pandas_object(orders[['CustomerID', 'OrderDate', 'TotalAmount']], index=False).values
+    
+    history = _cohort_history()
+    with history['lock']:
+        previous = history['state']
+        state = None
+        if previous is not None and previous['last_month'] is not None:
+            loaded = months <= previous['last_month']
+            if _orders_digest(row_hashes[loaded]) == history['digest']:
+                state = update_cohorts(previous, orders[~loaded]) if not loaded.all() else previous
+        if state is None:
+            state = build_cohorts(orders)
+        history['state'] = state
+        history['digest'] = _orders_digest(row_hashes)
+    return state
+
+def get_cohorts(df):
+    """Cohort state built once per dataset version (read-only)"""
+    return get_derived(df, 'cohorts')
+
+def cohort_matrix(state, value='active'):
+    """Cohort x months-since-first-purchase table of active customers or revenue.
+    
+    Cells a cohort has not reached yet are NaN; column 0 holds the cohort sizes.
+    """
+    matrix = state[value].astype(float)
+    size = matrix.shape[0]
+    matrix[np.arange(size)[:, None] + np.arange(size)[None, :] >= size] = np.nan
+    base_month = 0 if state['base_month'] is None else state['base_month']
+    labels = [f'{month // 12}-{month % 12 + 1:02d}' for month in range(base_month, base_month + size)]
+    table = pd.DataFrame(matrix, index=pd.Index(labels, name='Coorte'), columns=pd.RangeIndex(size, name='Mes'))
+    return table[table[0] > 0] if size else table
+
+def cohort_retention(state):
+    """Share (%) of each cohort active n months after its first purchase"""
+    active = cohort_matrix(state)
+    return active.div(active[0], axis=0) * 100
+
+def cohort_revenue_curves(state):
+    """Cumulative revenue per acquired customer by months since first purchase, per acquisition year.
+    
+    Each point only averages the cohorts that have already reached that month.
+    """
+    active = cohort_matrix(state)
+    cumulative = cohort_matrix(state, 'revenue').loc[active.index].cumsum(axis=1)
+    years = active.index.str[:4].rename('Ano')
+    reached = cumulative.notna().mul(active[0], axis=0)
+    curves = cumulative.groupby(years).sum() / reached.groupby(years).sum()
+    return curves.T
@@ -0,0 +1,151 @@
+"""Headless batch generation of the PDF reports.
+
+Computes the report inputs straight from the dataset and renders one executive
+summary (and, for multi-seller scopes, one seller performance report) per
+slice in parallel, e.g. for a nightly job:
+
+    python generate_reports.py --output-dir reports --by all country state seller --workers 4
+
+A manifest.json describing every generated file is written next to the PDFs.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from data_processor import (
+    preprocess_data,
+    get_summary_metrics,
+    get_seller_performance,
+    get_action_plan_report_inputs,
+    get_data_fingerprint
+)
+from pdf_generator import generate_executive_summary_pdf, generate_performance_pdf
+from report_charts import monthly_revenue_chart_spec, seller_ranking_chart_spec, render_charts
+
+# Slice dimension for each --by option (None = the whole dataset)
+SCOPES = {
+    'all': None,
+    'country': 'Country',
+    'state': 'State',
+    'seller': 'SellerID'
+}
+
+def slugify(value):
+    """File-system safe version of a slice key"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_') or 'sem_nome'
+
+def iter_slices(df, scope):
+    """Yield (key, slice) pairs for a report scope"""
+    column = SCOPES[scope]
+    if column is None:
+        yield 'geral', df
+        return
+    for key, group in df.groupby(column, sort=True):
+        yield key, group
+
+def build_jobs(df, scopes):
+    """Compute every report's inputs; rendering happens later in the pool"""
+    jobs = []
+    for scope in scopes:
+        for key, group in iter_slices(df, scope):
+            metrics = get_summary_metrics(group)
+            pdf_metrics, quick_wins = get_action_plan_report_inputs(group, metrics)
+            base_name = f'{scope}_{slugify(key)}'
+            # A single seller's slice has no ranking to report
+            seller_data = get_seller_performance(group) if scope != 'seller' else None
+            summary_charts = [monthly_revenue_chart_spec(group)]
+            if seller_data is not None and len(seller_data) > 0:
+                summary_charts.append(seller_ranking_chart_spec(seller_data))
+
+            jobs.append({
+                'report': 'executive_summary',
+                'scope': scope,
+                'key': str(key),
+                'file_name': f'{base_name}_sumario_executivo.pdf',
+                'args': (pdf_metrics, quick_wins, summary_charts),
+                'charts': summary_charts
+            })
+
+            if seller_data is not None and len(seller_data) > 0:
+                jobs.append({
+                    'report': 'performance',
+                    'scope': scope,
+                    'key': str(key),
+                    'file_name': f'{base_name}_performance_vendedores.pdf',
+                    'args': (seller_data, metrics),
+                    'charts': [seller_ranking_chart_spec(seller_data)]
+                })
+    return jobs
+
+def render_job(job, output_dir):
+    """Render one report to disk (runs in a worker process)"""
+    started = time.perf_counter()
+    path = os.path.join(output_dir, job['file_name'])
+    if job['report'] == 'executive_summary':
+        generate_executive_summary_pdf(*job['args'], output_path=path)
+    else:
+        generate_performance_pdf(*job['args'], output_path=path)
+
+    return {
+        'report': job['report'],
+        'scope': job['scope'],
+        'key': job['key'],
+        'file': job['file_name'],
+        'bytes': os.path.getsize(path),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Geracao em lote dos relatorios PDF')
+    parser.add_argument('--data', default='Amazon.csv', help='CSV de vendas')
+    parser.add_argument('--output-dir', default='reports', help='Diretorio de saida')
+    parser.add_argument('--by', nargs='+', choices=sorted(SCOPES), default=['all', 'country'],
+                        help='Recortes para os quais gerar relatorios')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos de renderizacao')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df = preprocess_data(pd.read_csv(args.data))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = build_jobs(df, args.by)
+
+    # Render every distinct chart once up front; report workers then hit the cache
+    chart_specs = [spec for job in jobs for spec in job['charts']]
+    chart_paths = render_charts(chart_specs, workers=args.workers)
+    print(f'{len(set(chart_paths))} graficos prontos.')
+    print(f'{len(jobs)} relatorios para gerar com {args.workers} processos...')
+
+    entries, errors = [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(render_job, job, args.output_dir): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                entries.append(future.result())
+            except Exception as e:
+                errors.append({'file': job['file_name'], 'error': f'{type(e).__name__}: {e}'})
+
+    entries.sort(key=lambda entry: entry['file'])
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'dataset_fingerprint': get_data_fingerprint(df),
+        'scopes': args.by,
+        'reports': entries,
+        'errors': errors,
+        'total_seconds': round(time.perf_counter() - started, 3)
+    }
+    with open(os.path.join(args.output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"{len(entries)} relatorios gerados em {manifest['total_seconds']}s; {len(errors)} erros. "
+          f"Manifesto: {os.path.join(args.output_dir, 'manifest.json')}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""Pluggable LLM backends used by ai_models.
+
+GeminiBackend talks to the real API. RecordingBackend captures responses to a
+JSON file and ReplayBackend serves them back offline with simulated latency, so
+prompt-building and post-processing can be benchmarked without the network.
+LLMGovernor rate-limits and bounds the concurrency of every outbound call.
+"""
+import contextlib
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.llms import LLM
+
+# Call priorities: lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+LLM_REQUESTS_PER_MINUTE = 60
+LLM_BURST = 5
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_QUEUE = 50
+LLM_QUEUE_TIMEOUT = 90  # seconds an interactive call may wait for a slot
+LLM_QUOTA_RETRIES = 2
+
+_current_priority = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+class GeminiBackend:
+    """Call the Gemini API directly (the default backend)"""
+
+    def __init__(self, model_name='gemini-2.5-flash'):
+        self.model_name = model_name
+
+    def generate(self, prompt, stop=None):
+        model = genai.GenerativeModel(self.model_name)
+        config = genai.GenerationConfig(stop_sequences=list(stop)) if stop else None
+        response = model.generate_content(prompt, generation_config=config)
+        return response.text
+
+def prompt_key(prompt, stop=None):
+    """Stable key identifying a prompt and its stop sequences"""
+    payload = json.dumps({'prompt': prompt, 'stop': list(stop or [])}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def load_recording(path):
+    """Load recorded responses, or an empty recording if the file is missing"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+class RecordingBackend:
+    """Forward calls to another backend and capture the responses to disk"""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.records = load_recording(path)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, stop=None):
+        started = time.perf_counter()
+        text = self.inner.generate(prompt, stop=stop)
+        latency = time.perf_counter() - started
+
+        with self._lock:
+            self.records[prompt_key(prompt, stop)] = {
+                'response': text,
+                'latency': round(latency, 4),
+                'prompt_chars': len(prompt)
+            }
+            # Write a sibling temp file and swap it in, so an interrupted run never
+            # leaves a truncated recording behind
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.records, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+        return text
+
+class ReplayBackend:
+    """Serve recorded responses offline with configurable simulated latency"""
+
+    def __init__(self, path, latency=None, latency_scale=1.0):
+        # latency=None replays each call's recorded latency (times latency_scale);
+        # a number applies the same fixed delay in seconds to every call
+        self.records = load_recording(path)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.calls = 0
+        self.misses = 0
+        self.simulated_seconds = 0.0
+
+    def generate(self, prompt, stop=None):
+        self.calls += 1
+        record = self.records.get(prompt_key(prompt, stop))
+        if record is None:
+            self.misses += 1
+            raise LookupError('No recorded response for this prompt; record it first')
+
+        delay = self.latency if self.latency is not None else record['latency'] * self.latency_scale
+        time.sleep(delay)
+        self.simulated_seconds += delay
+        return record['response']
+
+class BackendLLM(LLM):
+    """LangChain adapter so agents can run on any backend"""
+
+    backend: object
+
+    @property
+    def _llm_type(self):
+        return 'backend'
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self.backend.generate(prompt, stop=stop)
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run the LLM calls made inside the block at the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+class LLMQueueFull(RuntimeError):
+    """Raised when too many LLM calls are already waiting"""
+
+class TokenBucket:
+    """Token-bucket rate limiter (not thread-safe; guarded by LLMGovernor)"""
+
+    def __init__(self, rate_per_second, capacity, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def try_acquire(self):
+        """Take one token; return 0 on success or the seconds until one is available"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class LLMGovernor:
+    """Process-wide rate limiter and bounded, prioritised concurrency queue"""
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, burst=LLM_BURST,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, clock=time.monotonic):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst, clock=clock)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timed_out': 0,
+            'max_queue_depth': 0,
+            'total_wait_seconds': 0.0
+        }
+
+    def reconfigure(self, requests_per_minute=None, burst=None, max_concurrency=None, max_queue=None):
+        """Change limits at runtime; waiting calls re-check immediately"""
+        with self._cond:
+            if requests_per_minute is not None:
+                self.bucket.rate = requests_per_minute / 60.0
+            if burst is not None:
+                self.bucket.capacity = burst
+                self.bucket.tokens = min(self.bucket.tokens, burst)
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+            if max_queue is not None:
+                self.max_queue = max_queue
+            self._cond.notify_all()
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Block until this call may start; honours priority, rate and concurrency"""
+        ticket = (priority, next(self._sequence))
+        started = self.clock()
+        deadline = None if timeout is None else started + timeout
+
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise LLMQueueFull(f'Fila de chamadas ao LLM cheia ({self.max_queue} aguardando)')
+
+            heapq.heappush(self._waiting, ticket)
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._waiting))
+
+            while True:
+                wait = None
+                if self._waiting[0] == ticket and self._in_flight < self.max_concurrency:
+                    wait = self.bucket.try_acquire()
+                    if wait == 0:
+                        break
+
+                if deadline is not None:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self._waiting.remove(ticket)
+                        heapq.heapify(self._waiting)
+                        self._stats['timed_out'] += 1
+                        self._cond.notify_all()
+                        raise TimeoutError(f'Tempo de espera por uma vaga no LLM excedido ({timeout}s)')
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            self._stats['total_wait_seconds'] += self.clock() - started
+            self._cond.notify_all()
+
+    def release(self):
+        """Mark a call started with acquire() as finished"""
+        with self._cond:
+            self._in_flight -= 1
+            self._stats['completed'] += 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority=None, timeout=None):
+        """Context manager around acquire()/release(); defaults to the current priority"""
+        self.acquire(_current_priority.get() if priority is None else priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self):
+        """Snapshot of queue depth, concurrency and counters"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['queue_depth'] = len(self._waiting)
+            snapshot['queue_depth_interactive'] = sum(1 for p, _ in self._waiting if p == INTERACTIVE)
+            snapshot['queue_depth_background'] = sum(1 for p, _ in self._waiting if p != INTERACTIVE)
+            snapshot['in_flight'] = self._in_flight
+        started = snapshot['submitted'] - snapshot['rejected'] - snapshot['timed_out'] - snapshot['queue_depth']
+        snapshot['avg_wait_seconds'] = snapshot['total_wait_seconds'] / started if started else 0.0
+        return snapshot
+
+class GovernedBackend:
+    """Run another backend's calls through an LLMGovernor"""
+
+    def __init__(self, inner, governor, max_retries=LLM_QUOTA_RETRIES):
+        self.inner = inner
+        self.governor = governor
+        self.max_retries = max_retries
+
+    def generate(self, prompt, stop=None):
+        priority = _current_priority.get()
+        timeout = LLM_QUEUE_TIMEOUT if priority == INTERACTIVE else None
+
+        for attempt in range(self.max_retries + 1):
+            with self.governor.slot(priority, timeout):
+                try:
+                    return self.inner.generate(prompt, stop=stop)
+                except ResourceExhausted:
+                    if attempt == self.max_retries:
+                        raise
+            # Quota hit despite the limiter: back off before queueing again
+            time.sleep(2 ** attempt)
+
+class GovernorCallbackHandler(BaseCallbackHandler):
+    """Hold a governor slot for every LLM call a LangChain model makes"""
+
+    raise_error = True
+
+    def __init__(self, governor):
+        self.governor = governor
+        self._active_runs = set()
+        self._lock = threading.Lock()
+
+    def _start(self, run_id):
+        priority = _current_priority.get()
+        self.governor.acquire(priority, LLM_QUEUE_TIMEOUT if priority == INTERACTIVE else None)
+        with self._lock:
+            self._active_runs.add(run_id)
+
+    def _finish(self, run_id):
+        with self._lock:
+            if run_id not in self._active_runs:
+                return
+            self._active_runs.discard(run_id)
+        self.governor.release()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
@@ -1,7 +1,7 @@
 import streamlit as st
 import plotly.graph_objects as go
 from data_processor import load_data, preprocess_data, get_summary_metrics
-from utils import apply_custom_css, display_insight_box
+from utils import apply_custom_css, display_insight_box, plotly_chart
 import pandas as pd
 from datetime import datetime
 
@@ -231,7 +231,7 @@ fig.update_layout(
     margin=dict(l=20, r=20, t=20, b=20)
 )
 
-st.plotly_chart(fig, width='stretch')
+plotly_chart(fig)
 
 st.markdown("---")
 
@@ -2,7 +2,7 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from data_processor import load_data, preprocess_data, get_summary_metrics, filter_data
-from utils import apply_custom_css, create_metric_card, format_currency, create_timeline_chart, create_pie_chart, display_insight_box
+from utils import apply_custom_css, create_metric_card, format_currency, create_timeline_chart, create_pie_chart, display_insight_box, plotly_chart
 import pandas as pd
 
 st.set_page_config(page_title="Overview Dashboard", page_icon="📊", layout="wide")
@@ -165,7 +165,7 @@ with col1:
     daily_revenue.columns = ['Date', 'Revenue']
     
     fig = create_timeline_chart(daily_revenue, 'Date', 'Revenue', 'Receita Diária')
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("### 📊 Status dos Pedidos")
@@ -176,7 +176,7 @@ with col2:
         status_counts.index,
         ''
     )
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
@@ -197,8 +197,10 @@ with col1:
             colorscale='Purples',
             showscale=False
         ),
-        text=[f'${v:,.0f}' for v in category_revenue.values],
-        textposition='outside'
+        text=category_revenue.values,
+        texttemplate='$%{text:,.0f}',
+        textposition='outside',
+        hovertemplate='<b>%{y}</b><br>Receita: $%{text:,.0f}<extra></extra>'
     ))
     
     fig.update_layout(
@@ -213,7 +215,7 @@ with col1:
         yaxis={'showgrid': False}
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("### 💳 Métodos de Pagamento")
@@ -238,7 +240,7 @@ with col2:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
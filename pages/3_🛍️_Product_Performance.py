@@ -1,8 +1,15 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import load_data, preprocess_data, get_top_products, get_category_performance
-from utils import apply_custom_css, create_bar_chart, create_scatter_plot, display_insight_box
+from data_processor import (
+    load_data,
+    preprocess_data,
+    get_top_products,
+    get_category_performance,
+    get_product_facts,
+    screen_products
+)
+from utils import apply_custom_css, create_bar_chart, create_scatter_plot, display_insight_box, plotly_chart
 import pandas as pd
 
 st.set_page_config(page_title="Product Performance", page_icon="🛍️", layout="wide")
@@ -19,18 +26,6 @@ with st.spinner("Carregando dados..."):
         st.stop()
     df = preprocess_data(df_raw)
 
-# Sidebar options
-st.sidebar.header("⚙️ Opções")
-
-top_n = st.sidebar.slider("Número de Top Produtos", 5, 50, 20)
-
-metric_choice = st.sidebar.radio(
-    "Métrica Principal",
-    ["Receita", "Quantidade", "Pedidos"]
-)
-
-metric_map = {"Receita": "revenue", "Quantidade": "quantity", "Pedidos": "orders"}
-
 # Category Performance Overview
 st.markdown("### 📊 Performance por Categoria")
 
@@ -111,7 +106,7 @@ with col1:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("### 📈 Margem vs Desconto por Categoria")
@@ -140,66 +135,71 @@ with col2:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
-# Top Products
-st.markdown(f"### 🏆 Top {top_n} Produtos - {metric_choice}")
-
-top_products_data = get_top_products(df, top_n, metric_map[metric_choice])
-
-if metric_choice == "Receita":
-    col_name = 'TotalAmount'
-    prefix = '$'
-elif metric_choice == "Quantidade":
-    col_name = 'Quantity'
-    prefix = ''
-else:
-    col_name = 'ProductName'
-    prefix = ''
-
-fig = go.Figure()
-
-colors = px.colors.sequential.Purples_r[:len(top_products_data)]
-
-if metric_choice == "Receita":
-    values = top_products_data[col_name]
-    text = [f'${v:,.0f}' for v in values]
-elif metric_choice == "Quantidade":
-    values = top_products_data[col_name]
-    text = [f'{v:,.0f}' for v in values]
-else:
+@st.fragment
+def render_top_products(df):
+    """Top-N product ranking; its own widgets rerun only this section"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+    
+    with col1:
+        top_n = st.slider("Número de Top Produtos", 5, 50, 20)
+    
+    with col2:
+        metric_choice = st.radio(
+            "Métrica Principal",
+            ["Receita", "Quantidade", "Pedidos"],
+            horizontal=True
+        )
+    
+    with col3:
+        category_choice = st.selectbox("Categoria", ["Todas"] + sorted(df['Category'].unique()))
+    
+    metric_map = {"Receita": "revenue", "Quantidade": "quantity", "Pedidos": "orders"}
+    
+    # Top Products
+    st.markdown(f"### 🏆 Top {top_n} Produtos - {metric_choice}")
+    
+    category = None if category_choice == "Todas" else category_choice
+    top_products_data = get_top_products(df, top_n, metric_map[metric_choice], category)
+    
+    fig = go.Figure()
+    
+    # Column 0 is ProductName, column 1 the chosen metric
     values = top_products_data.iloc[:, 1]
-    text = [f'{v:,}' for v in values]
-
-fig.add_trace(go.Bar(
-    y=top_products_data['ProductName'][::-1],
-    x=values[::-1],
-    orientation='h',
-    marker=dict(
-        color=values[::-1],
-        colorscale='Purples',
-        showscale=False
-    ),
-    text=text[::-1],
-    textposition='outside',
-    hovertemplate='<b>%{y}</b><br>' + metric_choice + ': %{x:,.0f}<extra></extra>'
-))
-
-fig.update_layout(
-    xaxis_title=metric_choice,
-    yaxis_title='',
-    plot_bgcolor='rgba(0,0,0,0)',
-    paper_bgcolor='rgba(0,0,0,0)',
-    font={'color': '#F1F5F9'},
-    xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-    yaxis={'showgrid': False},
-    height=max(400, top_n * 20),
-    margin=dict(l=200)
-)
+    text_template = '$%{x:,.0f}' if metric_choice == "Receita" else '%{x:,.0f}'
+    
+    fig.add_trace(go.Bar(
+        y=top_products_data['ProductName'][::-1],
+        x=values[::-1],
+        orientation='h',
+        marker=dict(
+            color=values[::-1],
+            colorscale='Purples',
+            showscale=False
+        ),
+        texttemplate=text_template,
+        textposition='outside',
+        hovertemplate='<b>%{y}</b><br>' + metric_choice + ': %{x:,.0f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        xaxis_title=metric_choice,
+        yaxis_title='',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#F1F5F9'},
+        xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+        yaxis={'showgrid': False},
+        height=max(400, top_n * 20),
+        margin=dict(l=200)
+    )
+    
+    plotly_chart(fig)
 
-st.plotly_chart(fig, width='stretch')
+render_top_products(df)
 
 st.markdown("---")
 
@@ -220,8 +220,10 @@ with col1:
             colorscale='Viridis',
             showscale=False
         ),
-        text=[f'${v:,.0f}' for v in brand_revenue.values],
-        textposition='outside'
+        text=brand_revenue.values,
+        texttemplate='$%{text:,.0f}',
+        textposition='outside',
+        hovertemplate='<b>%{y}</b><br>Receita: $%{text:,.0f}<extra></extra>'
     ))
     
     fig.update_layout(
@@ -236,7 +238,7 @@ with col1:
         title='Top 15 Marcas por Receita'
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     top_brand = df.groupby('Brand')['TotalAmount'].sum().idxmax()
@@ -261,20 +263,13 @@ st.markdown("---")
 # Price vs Quantity Analysis
 st.markdown("### 💰 Análise Preço vs Quantidade")
 
-product_summary = df.groupby('ProductName').agg({
-    'UnitPrice': 'mean',
-    'Quantity': 'sum',
-    'TotalAmount': 'sum',
-    'Category': 'first'
-}).reset_index()
-
-product_summary = product_summary.nlargest(100, 'TotalAmount')
+product_summary = screen_products(df, sort_by='Faturamento', top_k=100)
 
 fig = px.scatter(
     product_summary,
-    x='UnitPrice',
-    y='Quantity',
-    size='TotalAmount',
+    x='Preco_Medio',
+    y='Quantidade',
+    size='Faturamento',
     color='Category',
     hover_name='ProductName',
     log_x=True,
@@ -292,7 +287,7 @@ fig.update_layout(
     height=500
 )
 
-st.plotly_chart(fig, width='stretch')
+plotly_chart(fig)
 
 st.markdown("---")
 
@@ -302,8 +297,10 @@ st.markdown("### 💡 Insights de Produtos")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    top_product = df.groupby('ProductName')['TotalAmount'].sum().idxmax()
-    top_product_revenue = df.groupby('ProductName')['TotalAmount'].sum().max()
+    # Same per-name ranking as the top products chart
+    top_product_row = get_top_products(df, 1).iloc[0]
+    top_product = top_product_row['ProductName']
+    top_product_revenue = top_product_row['TotalAmount']
     
     display_insight_box(
         "Produto Campeão",
@@ -322,8 +319,9 @@ with col2:
     )
 
 with col3:
-    total_products = df['ProductID'].nunique()
-    avg_product_revenue = df.groupby('ProductID')['TotalAmount'].sum().mean()
+    product_facts = get_product_facts(df)
+    total_products = len(product_facts)
+    avg_product_revenue = product_facts['Faturamento'].mean()
     
     display_insight_box(
         "Diversificação",
@@ -1,9 +1,18 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import load_data, preprocess_data, get_customer_segments_rfm
+from data_processor import (
+    load_data,
+    preprocess_data,
+    get_customer_segments_rfm,
+    count_distinct,
+    get_cohorts,
+    cohort_matrix,
+    cohort_retention,
+    cohort_revenue_curves
+)
 from ai_models import perform_customer_clustering, predict_customer_churn
-from utils import apply_custom_css, create_3d_scatter, display_insight_box
+from utils import apply_custom_css, create_3d_scatter, create_heatmap, display_insight_box, cap_points, scatter_render_mode, plotly_chart
 import pandas as pd
 
 st.set_page_config(page_title="Customer Insights", page_icon="👥", layout="wide")
@@ -21,7 +30,7 @@ with st.spinner("Carregando dados..."):
     df = preprocess_data(df_raw)
 
 # Customer overview metrics
-total_customers = df['CustomerID'].nunique()
+total_customers = count_distinct(df, 'CustomerID')
 total_orders = len(df)
 avg_orders_per_customer = total_orders / total_customers
 total_revenue = df['TotalAmount'].sum()
@@ -80,7 +89,7 @@ with col1:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### 📋 Segmentos")
@@ -109,14 +118,16 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Recency vs Frequency
+    rfm_points = cap_points(rfm_with_churn.reset_index())
     fig = px.scatter(
-        rfm_with_churn.reset_index(),
+        rfm_points,
         x='Recency',
         y='Frequency',
         size='Monetary',
         color='Segment',
         hover_data=['CustomerID', 'RFM_Score'],
-        title='Recency vs Frequency (tamanho = Monetary)'
+        title='Recency vs Frequency (tamanho = Monetary)',
+        render_mode=scatter_render_mode(len(rfm_points))
     )
     
     fig.update_layout(
@@ -128,18 +139,19 @@ with col1:
         height=450
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     # Frequency vs Monetary
     fig = px.scatter(
-        rfm_with_churn.reset_index(),
+        rfm_points,
         x='Frequency',
         y='Monetary',
         color='Segment',
         size='Monetary',
         hover_data=['CustomerID', 'Recency'],
-        title='Frequency vs Monetary Value'
+        title='Frequency vs Monetary Value',
+        render_mode=scatter_render_mode(len(rfm_points))
     )
     
     fig.update_layout(
@@ -151,52 +163,66 @@ with col2:
         height=450
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
-# Customer Clustering
-st.markdown("### 🎯 Clustering de Clientes (Machine Learning)")
-
-n_clusters = st.slider("Número de Clusters", 3, 6, 4)
-
-with st.spinner("Executando análise de clustering..."):
-    customer_clusters, cluster_summary, cluster_map = perform_customer_clustering(df, n_clusters)
-
-col1, col2 = st.columns([2, 1])
-
-with col1:
-    # 3D visualization
-    fig = create_3d_scatter(
-        customer_clusters,
-        'Total_Spent',
-        'Order_Count',
-        'Avg_Order_Value',
-        'Cluster_Name',
-        'Clusters de Clientes (3D)'
-    )
+@st.fragment
+def render_clustering(df):
+    """Customer clustering; the cluster slider reruns only this section"""
+    # Customer Clustering
+    st.markdown("### 🎯 Clustering de Clientes (Machine Learning)")
     
-    st.plotly_chart(fig, width='stretch')
-
-with col2:
-    st.markdown("#### 📊 Perfil dos Clusters")
+    n_clusters = st.slider("Número de Clusters", 3, 6, 4)
     
-    st.dataframe(
-        cluster_summary.rename(columns={
-            'Total_Spent': 'Gasto Médio',
-            'Order_Count': 'Pedidos Médios',
-            'Avg_Order_Value': 'Ticket Médio'
-        }).style.format({
-            'Gasto Médio': '${:,.2f}',
-            'Pedidos Médios': '{:.1f}',
-            'Ticket Médio': '${:,.2f}'
-        }),
-        width='stretch'
-    )
+    with st.spinner("Executando análise de clustering..."):
+        customer_clusters, cluster_summary, cluster_map = perform_customer_clustering(df, n_clusters)
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        # 3D visualization
+        fig = create_3d_scatter(
+            customer_clusters,
+            'Total_Spent',
+            'Order_Count',
+            'Avg_Order_Value',
+            'Cluster_Name',
+            'Clusters de Clientes (3D)'
+        )
+        
+        plotly_chart(fig)
+    
+    with col2:
+        st.markdown("#### 📊 Perfil dos Clusters")
+        
+        st.dataframe(
+            cluster_summary.rename(columns={
+                'Total_Spent': 'Gasto Médio',
+                'Order_Count': 'Pedidos Médios',
+                'Avg_Order_Value': 'Ticket Médio'
+            }).style.format({
+                'Gasto Médio': '${:,.2f}',
+                'Pedidos Médios': '{:.1f}',
+                'Ticket Médio': '${:,.2f}'
+            }),
+            width='stretch'
+        )
+        
+        for cluster_id, cluster_name in cluster_map.items():
+            count = len(customer_clusters[customer_clusters['Cluster'] == cluster_id])
+            st.markdown(f"**{cluster_name}**: {count:,} clientes")
+    
+    vip_cluster = customer_clusters[customer_clusters['Cluster_Name'] == 'VIP Customers']
+    vip_revenue = vip_cluster['Total_Spent'].sum()
     
-    for cluster_id, cluster_name in cluster_map.items():
-        count = len(customer_clusters[customer_clusters['Cluster'] == cluster_id])
-        st.markdown(f"**{cluster_name}**: {count:,} clientes")
+    display_insight_box(
+        "VIP Customers",
+        f"Cluster VIP gerou ${vip_revenue:,.2f} em receita total.",
+        "💎"
+    )
+
+render_clustering(df)
 
 st.markdown("---")
 
@@ -226,7 +252,7 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     high_risk_customers = rfm_with_churn[rfm_with_churn['Churn_Risk'] == 'High Risk']
@@ -279,10 +305,77 @@ st.dataframe(
 
 st.markdown("---")
 
+# Acquisition cohorts
+st.markdown("### 📅 Coortes de Aquisição")
+
+cohorts = get_cohorts(df)
+
+col1, col2 = st.columns([3, 2])
+
+with col1:
+    # Month 0 is always 100%, so the heatmap starts at month 1; last 24 cohorts
+    recent_retention = cohort_retention(cohorts).iloc[-24:, 1:13]
+    
+    fig = create_heatmap(
+        recent_retention.values,
+        [f'M{month}' for month in recent_retention.columns],
+        list(recent_retention.index),
+        'Retenção por Coorte (% de clientes ativos)'
+    )
+    fig.update_traces(
+        texttemplate='%{z:.0f}%',
+        hovertemplate='Coorte %{y}<br>Mês %{x}: %{z:.1f}%<extra></extra>'
+    )
+    fig.update_layout(xaxis_title='Meses desde a primeira compra', yaxis_title='Coorte', height=600)
+    
+    plotly_chart(fig)
+
+with col2:
+    revenue_curves = cohort_revenue_curves(cohorts)
+    
+    fig = go.Figure()
+    
+    for year in revenue_curves.columns:
+        fig.add_trace(go.Scatter(
+            x=revenue_curves.index,
+            y=revenue_curves[year],
+            mode='lines',
+            name=str(year),
+            hovertemplate='Mês %{x}<br>$%{y:,.2f} por cliente<extra>' + str(year) + '</extra>'
+        ))
+    
+    fig.update_layout(
+        title='Receita Acumulada por Cliente',
+        xaxis_title='Meses desde a primeira compra',
+        yaxis_title='Receita por Cliente ($)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#F1F5F9'},
+        xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+        yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+        legend_title='Ano de Aquisição',
+        height=600
+    )
+    
+    plotly_chart(fig)
+
+# Month-1 retention weighted by cohort size, over cohorts that reached month 1
+cohort_activity = cohort_matrix(cohorts)
+reached_month_one = cohort_activity[1].notna()
+month_one_retention = cohort_activity.loc[reached_month_one, 1].sum() / cohort_activity.loc[reached_month_one, 0].sum() * 100
+
+display_insight_box(
+    "Retenção no 1º Mês",
+    f"Em média {month_one_retention:.1f}% dos novos clientes voltam a comprar no mês seguinte à primeira compra.",
+    "📅"
+)
+
+st.markdown("---")
+
 # Insights
 st.markdown("### 💡 Insights de Clientes")
 
-col1, col2, col3 = st.columns(3)
+col1, col2 = st.columns(2)
 
 with col1:
     champions = len(rfm_with_churn[rfm_with_churn['Segment'] == 'Champions'])
@@ -302,13 +395,3 @@ with col2:
         f"{at_risk:,} clientes em alto risco precisam de atenção imediata para retenção.",
         "⚠️"
     )
-
-with col3:
-    vip_cluster = customer_clusters[customer_clusters['Cluster_Name'] == 'VIP Customers']
-    vip_revenue = vip_cluster['Total_Spent'].sum()
-    
-    display_insight_box(
-        "VIP Customers",
-        f"Cluster VIP gerou ${vip_revenue:,.2f} em receita total.",
-        "💎"
-    )
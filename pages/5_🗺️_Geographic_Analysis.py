@@ -1,8 +1,8 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import load_data, preprocess_data, get_geographic_summary
-from utils import apply_custom_css, display_insight_box
+from data_processor import load_data, preprocess_data, get_geographic_summary, get_geo_summary, get_scatter_density
+from utils import apply_custom_css, display_insight_box, create_density_scatter, plotly_chart
 import pandas as pd
 
 st.set_page_config(page_title="Geographic Analysis", page_icon="🗺️", layout="wide")
@@ -26,7 +26,7 @@ geo_summary = get_geographic_summary(df)
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_countries = df['Country'].nunique()
+    total_countries = len(geo_summary)
     st.metric("🌍 Países Ativos", total_countries)
 
 with col2:
@@ -38,7 +38,7 @@ with col3:
     st.metric("💰 Receita do Líder", f"${top_country_revenue:,.2f}")
 
 with col4:
-    total_cities = df['City'].nunique()
+    total_cities = len(get_geo_summary(df, 'CityName'))
     st.metric("🏙️ Cidades Atendidas", total_cities)
 
 st.markdown("---")
@@ -46,12 +46,7 @@ st.markdown("---")
 # World map
 st.markdown("### 🌎 Mapa de Vendas por País")
 
-country_data = df.groupby('Country').agg({
-    'TotalAmount': 'sum',
-    'OrderID': 'count'
-}).reset_index()
-
-country_data.columns = ['Country', 'Revenue', 'Orders']
+country_data = geo_summary[['Revenue', 'Orders']].reset_index()
 
 # Map country names to ISO codes
 country_iso_map = {
@@ -87,7 +82,7 @@ fig.update_layout(
     height=500
 )
 
-st.plotly_chart(fig, width='stretch')
+plotly_chart(fig)
 
 st.markdown("---")
 
@@ -107,8 +102,10 @@ with col1:
                 colorscale='Purples',
                 showscale=False
             ),
-            text=[f'${v:,.0f}' for v in geo_summary['Revenue']],
-            textposition='outside'
+            text=geo_summary['Revenue'],
+            texttemplate='$%{text:,.0f}',
+            textposition='outside',
+            hovertemplate='<b>%{y}</b><br>Receita: $%{text:,.0f}<extra></extra>'
         )
     ])
     
@@ -123,7 +120,7 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("### 📦 Pedidos por País")
@@ -151,20 +148,15 @@ with col2:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
 # State Analysis (for countries with state data)
 st.markdown("### 📍 Análise por Estado/Região")
 
-state_revenue = df.groupby(['Country', 'State']).agg({
-    'TotalAmount': 'sum',
-    'OrderID': 'count'
-}).reset_index()
-
+state_revenue = get_geo_summary(df, 'State')[['Receita', 'Pedidos']].reset_index()
 state_revenue.columns = ['País', 'Estado', 'Receita', 'Pedidos']
-state_revenue = state_revenue.sort_values('Receita', ascending=False)
 
 # Show top 20 states
 st.dataframe(
@@ -182,14 +174,9 @@ st.markdown("---")
 # City Analysis
 st.markdown("### 🏙️ Top 15 Cidades")
 
-city_data = df.groupby('City').agg({
-    'TotalAmount': 'sum',
-    'OrderID': 'count',
-    'Country': 'first'
-}).reset_index()
-
+city_data = get_geo_summary(df, 'CityName').head(15).reset_index()
+city_data = city_data[['City', 'Receita', 'Pedidos', 'Country']]
 city_data.columns = ['Cidade', 'Receita', 'Pedidos', 'País']
-city_data = city_data.sort_values('Receita', ascending=False).head(15)
 
 fig = go.Figure()
 
@@ -201,7 +188,8 @@ fig.add_trace(go.Bar(
         colorscale='Viridis',
         showscale=False
     ),
-    text=[f'${v:,.0f}' for v in city_data['Receita']],
+    text=city_data['Receita'],
+    texttemplate='$%{text:,.0f}',
     textposition='outside',
     hovertemplate='<b>%{x}</b><br>Receita: $%{y:,.2f}<extra></extra>'
 ))
@@ -217,7 +205,7 @@ fig.update_layout(
     height=450
 )
 
-st.plotly_chart(fig, width='stretch')
+plotly_chart(fig)
 
 st.markdown("---")
 
@@ -239,8 +227,10 @@ with col1:
                 colorscale='Reds',
                 showscale=False
             ),
-            text=[f'${v:.2f}' for v in geo_summary['Avg_Shipping_Cost']],
-            textposition='outside'
+            text=geo_summary['Avg_Shipping_Cost'],
+            texttemplate='$%{text:.2f}',
+            textposition='outside',
+            hovertemplate='<b>%{y}</b><br>Frete Médio: $%{text:.2f}<extra></extra>'
         )
     ])
     
@@ -255,55 +245,34 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### Custo de Frete vs Valor do Pedido")
     
-    # Sample for better visualization
-    sample_df = df.sample(min(5000, len(df)))
+    # Every order is binned; only isolated orders are drawn individually
+    density = get_scatter_density(df, 'TotalAmount', 'ShippingCost', group_col='Country')
     
-    fig = px.scatter(
-        sample_df,
-        x='TotalAmount',
-        y='ShippingCost',
-        color='Country',
-        opacity=0.6,
-        trendline='ols'
-    )
+    fig = create_density_scatter(density, 'TotalAmount', 'ShippingCost', color_col='Country')
     
     fig.update_layout(
         xaxis_title='Valor do Pedido ($)',
         yaxis_title='Custo de Frete ($)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font={'color': '#F1F5F9'},
-        xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-        yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
 # Regional Performance Metrics
 st.markdown("### 📊 Métricas Regionais Detalhadas")
 
-regional_metrics = df.groupby('Country').agg({
-    'TotalAmount': ['sum', 'mean'],
-    'OrderID': 'count',
-    'Quantity': 'sum',
-    'ShippingCost': 'mean',
-    'Discount': 'mean',
-    'CustomerID': 'nunique'
-}).round(2)
-
+regional_metrics = get_geo_summary(df, 'Country')[['Receita', 'Ticket_Medio', 'Pedidos', 'Itens',
+                                                   'Frete_Medio', 'Desconto_Medio', 'Clientes']]
 regional_metrics.columns = ['Receita Total', 'Ticket Médio', 'Pedidos', 
                             'Itens Vendidos', 'Frete Médio', 'Desconto Médio', 'Clientes']
 
-regional_metrics = regional_metrics.sort_values('Receita Total', ascending=False)
-
 st.dataframe(
     regional_metrics.style.background_gradient(cmap='Purples', subset=['Receita Total', 'Pedidos'])
                           .format({
@@ -326,7 +295,7 @@ st.markdown("### 💡 Insights Geográficos")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    us_revenue_pct = (geo_summary.loc['United States', 'Revenue'] / df['TotalAmount'].sum()) * 100
+    us_revenue_pct = (geo_summary.loc['United States', 'Revenue'] / geo_summary['Revenue'].sum()) * 100
     
     display_insight_box(
         "Concentração nos EUA",
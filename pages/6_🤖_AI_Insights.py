@@ -1,16 +1,19 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import load_data, preprocess_data, get_summary_metrics
+from data_processor import load_data, preprocess_data, get_summary_metrics, get_data_fingerprint, get_scatter_density
 from ai_models import (
     configure_gemini, 
-    generate_business_insights,
     ask_data_question,
-    analyze_sales_trends,
-    analyze_category_performance,
-    detect_anomalies
+    detect_anomalies,
+    generate_insight,
+    insight_retry_in,
+    get_llm_governor,
+    get_stored_insight,
+    is_precompute_running,
+    start_insights_precompute
 )
-from utils import apply_custom_css, display_insight_box
+from utils import apply_custom_css, display_insight_box, create_density_scatter, plotly_chart
 import pandas as pd
 
 def _load_gemini_key_from_secrets():
@@ -22,6 +25,37 @@ def _load_gemini_key_from_secrets():
         return None
     return None
 
+def render_stored_insight(kind, button_label, spinner_text, title=None):
+    """Show the precomputed insight for kind, with an explicit regenerate option"""
+    stored = get_stored_insight(df, metrics, kind)
+    label = "🔄 Regenerar" if stored else button_label
+    
+    if st.button(label, type="primary", width='stretch', key=f"generate_{kind}"):
+        with st.spinner(spinner_text):
+            try:
+                stored = generate_insight(df, metrics, kind, api_key)
+            except Exception as e:
+                st.error(f"Erro ao gerar insights: {str(e)}")
+                return False
+    
+    if stored is None:
+        if is_precompute_running(get_data_fingerprint(df)):
+            st.info("⏳ Insights sendo pré-calculados em segundo plano. Recarregue em instantes ou gere agora.")
+        elif insight_retry_in(get_data_fingerprint(df), kind) > 0:
+            st.warning("⚠️ A última geração automática falhou. Uma nova tentativa será feita mais tarde, ou gere agora.")
+        return False
+    
+    if stored.get('error'):
+        st.error(stored['text'])
+        return False
+    
+    st.markdown("---")
+    if title:
+        st.markdown(title)
+    st.caption(f"🕒 Gerado em {stored['generated_at']} para a versão atual dos dados")
+    st.markdown(stored['text'])
+    return True
+
 st.set_page_config(page_title="AI Insights", page_icon="🤖", layout="wide")
 apply_custom_css()
 
@@ -70,6 +104,11 @@ if not api_key:
 try:
     configure_gemini(api_key)
     st.sidebar.success("✅ API configurada com sucesso!")
+    llm_queue = get_llm_governor().metrics()
+    st.sidebar.caption(
+        f"🚦 Fila do LLM: {llm_queue['queue_depth']} aguardando · "
+        f"{llm_queue['in_flight']} em execução · espera média {llm_queue['avg_wait_seconds']:.1f}s"
+    )
 except Exception as e:
     st.sidebar.error(f"❌ Erro ao configurar API: {str(e)}")
     st.stop()
@@ -83,6 +122,9 @@ with st.spinner("Carregando dados..."):
     df = preprocess_data(df_raw)
     metrics = get_summary_metrics(df)
 
+# Business, trend and category insights are precomputed once per dataset version
+start_insights_precompute(df, metrics, api_key)
+
 st.markdown("---")
 
 # Tab navigation
@@ -99,20 +141,8 @@ with tab1:
     st.markdown("### 🧠 Insights de Negócio Gerados por IA")
     st.markdown("A IA analisa seus dados e gera recomendações acionáveis automaticamente.")
     
-    if st.button("🔄 Gerar Insights", type="primary", width='stretch'):
-        with st.spinner("🤖 Gemini está analisando seus dados..."):
-            try:
-                insights = generate_business_insights(df, metrics, api_key)
-                
-                st.markdown("---")
-                st.markdown("### 📊 Análise Completa")
-                
-                st.markdown(insights)
-                
-                st.success("✅ Análise concluída!")
-                
-            except Exception as e:
-                st.error(f"Erro ao gerar insights: {str(e)}")
+    if render_stored_insight('business', "🔄 Gerar Insights", "🤖 Gemini está analisando seus dados...", "### 📊 Análise Completa"):
+        st.success("✅ Análise concluída!")
     
     # Quick stats for context
     st.markdown("---")
@@ -181,98 +211,86 @@ with tab3:
     st.markdown("### 📈 Análise de Tendências com IA")
     st.markdown("O Gemini analisa padrões temporais e fornece previsões qualitativas.")
     
-    if st.button("📊 Analisar Tendências", type="primary", width='stretch'):
-        with st.spinner("🤖 Analisando tendências de vendas..."):
-            try:
-                trend_analysis = analyze_sales_trends(df, api_key)
-                
-                st.markdown("---")
-                st.markdown(trend_analysis)
-                
-                # Show trend chart
-                st.markdown("### 📈 Gráfico de Tendência")
-                
-                monthly_sales = df.groupby(df['OrderDate'].dt.to_period('M')).agg({
-                    'TotalAmount': 'sum'
-                }).reset_index()
-                
-                monthly_sales['OrderDate'] = monthly_sales['OrderDate'].astype(str)
-                
-                fig = px.line(
-                    monthly_sales,
-                    x='OrderDate',
-                    y='TotalAmount',
-                    title='Evolução Mensal de Vendas',
-                    markers=True
-                )
-                
-                fig.update_traces(line_color='#8B5CF6', line_width=3)
-                
-                fig.update_layout(
-                    xaxis_title='Mês',
-                    yaxis_title='Receita ($)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#F1F5F9'},
-                    xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-                    yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-                    height=400
-                )
-                
-                st.plotly_chart(fig, width='stretch')
-                
-            except Exception as e:
-                st.error(f"Erro na análise: {str(e)}")
+    if render_stored_insight('trends', "📊 Analisar Tendências", "🤖 Analisando tendências de vendas..."):
+        try:
+            # Show trend chart
+            st.markdown("### 📈 Gráfico de Tendência")
+            
+            monthly_sales = df.groupby(df['OrderDate'].dt.to_period('M')).agg({
+                'TotalAmount': 'sum'
+            }).reset_index()
+            
+            monthly_sales['OrderDate'] = monthly_sales['OrderDate'].astype(str)
+            
+            fig = px.line(
+                monthly_sales,
+                x='OrderDate',
+                y='TotalAmount',
+                title='Evolução Mensal de Vendas',
+                markers=True
+            )
+            
+            fig.update_traces(line_color='#8B5CF6', line_width=3)
+            
+            fig.update_layout(
+                xaxis_title='Mês',
+                yaxis_title='Receita ($)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font={'color': '#F1F5F9'},
+                xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+                yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+                height=400
+            )
+            
+            plotly_chart(fig)
+            
+        except Exception as e:
+            st.error(f"Erro na análise: {str(e)}")
 
 # Tab 4: Category Performance
 with tab4:
     st.markdown("### 🎯 Análise de Performance de Categorias com IA")
     st.markdown("Insights profundos sobre o desempenho de cada categoria de produto.")
     
-    if st.button("🔍 Analisar Categorias", type="primary", width='stretch'):
-        with st.spinner("🤖 Analisando performance das categorias..."):
-            try:
-                category_analysis = analyze_category_performance(df, api_key)
-                
-                st.markdown("---")
-                st.markdown(category_analysis)
-                
-                # Category comparison chart
-                st.markdown("### 📊 Comparação Visual")
-                
-                category_perf = df.groupby('Category').agg({
-                    'TotalAmount': 'sum',
-                    'OrderID': 'count',
-                    'Discount': 'mean'
-                }).round(2)
-                
-                category_perf.columns = ['Receita', 'Pedidos', 'Desconto Médio']
-                category_perf = category_perf.sort_values('Receita', ascending=True)
-                
-                fig = go.Figure()
-                
-                fig.add_trace(go.Bar(
-                    y=category_perf.index,
-                    x=category_perf['Receita'],
-                    name='Receita',
-                    orientation='h',
-                    marker=dict(color='#8B5CF6')
-                ))
-                
-                fig.update_layout(
-                    title='Receita por Categoria',
-                    xaxis_title='Receita ($)',
-                    yaxis_title='',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#F1F5F9'},
-                    height=400
-                )
-                
-                st.plotly_chart(fig, width='stretch')
-                
-            except Exception as e:
-                st.error(f"Erro na análise: {str(e)}")
+    if render_stored_insight('categories', "🔍 Analisar Categorias", "🤖 Analisando performance das categorias..."):
+        try:
+            # Category comparison chart
+            st.markdown("### 📊 Comparação Visual")
+            
+            category_perf = df.groupby('Category').agg({
+                'TotalAmount': 'sum',
+                'OrderID': 'count',
+                'Discount': 'mean'
+            }).round(2)
+            
+            category_perf.columns = ['Receita', 'Pedidos', 'Desconto Médio']
+            category_perf = category_perf.sort_values('Receita', ascending=True)
+            
+            fig = go.Figure()
+            
+            fig.add_trace(go.Bar(
+                y=category_perf.index,
+                x=category_perf['Receita'],
+                name='Receita',
+                orientation='h',
+                marker=dict(color='#8B5CF6')
+            ))
+            
+            fig.update_layout(
+                title='Receita por Categoria',
+                xaxis_title='Receita ($)',
+                yaxis_title='',
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font={'color': '#F1F5F9'},
+                height=400
+            )
+            
+            plotly_chart(fig)
+            
+        except Exception as e:
+            st.error(f"Erro na análise: {str(e)}")
 
 # Tab 5: Anomaly Detection
 with tab5:
@@ -313,34 +331,23 @@ with tab5:
                 # Anomaly scatter plot
                 st.markdown("### 📊 Visualização de Anomalias")
                 
-                plot_data = df.copy()
-                plot_data['Tipo'] = 'Normal'
-                plot_data.loc[anomalies.index, 'Tipo'] = 'Anomalia'
-                
-                # Sample for performance
-                plot_sample = plot_data.sample(min(5000, len(plot_data)))
-                
-                fig = px.scatter(
-                    plot_sample,
-                    x='UnitPrice',
-                    y='Quantity',
-                    color='Tipo',
-                    size='TotalAmount',
-                    hover_data=['ProductName', 'TotalAmount', 'Category'],
-                    color_discrete_map={'Normal': '#8B5CF6', 'Anomalia': '#EF4444'},
-                    title='Anomalias: Preço vs Quantidade'
-                )
-                
-                fig.update_layout(
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#F1F5F9'},
-                    xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-                    yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
-                    height=500
+                # All transactions as density, every anomaly drawn on top
+                density = get_scatter_density(df, 'UnitPrice', 'Quantity')
+                anomaly_points = anomalies.assign(Tipo='Anomalia')
+                
+                fig = create_density_scatter(
+                    density,
+                    'UnitPrice',
+                    'Quantity',
+                    title='Anomalias: Preço vs Quantidade',
+                    points=anomaly_points,
+                    color_col='Tipo',
+                    color_map={'Anomalia': '#EF4444'},
+                    hover_cols=('ProductName', 'TotalAmount', 'Category'),
+                    show_trends=False
                 )
                 
-                st.plotly_chart(fig, width='stretch')
+                plotly_chart(fig)
                 
                 # Anomaly table
                 st.markdown("### 📋 Top 20 Anomalias")
@@ -2,10 +2,17 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from data_processor import load_data, preprocess_data, get_summary_metrics
-from utils import apply_custom_css, display_insight_box
-import pandas as pd
-import numpy as np
+from data_processor import (
+    load_data,
+    preprocess_data,
+    get_summary_metrics,
+    get_seller_scorecard,
+    get_top_sellers,
+    get_seller_value_at_percentile,
+    get_discount_band_summary,
+    get_geo_summary
+)
+from utils import apply_custom_css, display_insight_box, plotly_chart
 
 st.set_page_config(page_title="Performance Comercial", page_icon="📈", layout="wide")
 apply_custom_css()
@@ -108,7 +115,7 @@ with col1:
         height=350
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### 🔍 Análise de Perdas")
@@ -129,16 +136,8 @@ st.markdown("---")
 # Performance por Vendedor
 st.markdown("### 👥 Performance por Vendedor (Top 20)")
 
-seller_perf = df[df['OrderStatus'] == 'Delivered'].groupby('SellerID').agg({
-    'TotalAmount': ['sum', 'mean', 'count'],
-    'Quantity': 'sum',
-    'Discount': 'mean',
-    'Net_Revenue': 'sum'
-}).round(2)
-
-seller_perf.columns = ['Faturamento', 'Ticket_Medio', 'Vendas', 'Itens', 'Desc_Medio', 'Margem_Liquida']
-seller_perf['Margem_%'] = (seller_perf['Margem_Liquida'] / seller_perf['Faturamento'] * 100).round(1)
-seller_perf = seller_perf.sort_values('Faturamento', ascending=False).head(20)
+seller_scorecard = get_seller_scorecard(df)
+seller_perf = get_top_sellers(seller_scorecard, 20)
 
 col1, col2 = st.columns([3, 1])
 
@@ -150,7 +149,8 @@ with col1:
         y=seller_perf['Faturamento'],
         name='Faturamento',
         marker_color='#8B5CF6',
-        text=seller_perf['Faturamento'].apply(lambda x: f'R$ {x:,.0f}'),
+        text=seller_perf['Faturamento'],
+        texttemplate='R$ %{text:,.0f}',
         textposition='outside',
         hovertemplate='<b>%{x}</b><br>Faturamento: R$ %{y:,.2f}<extra></extra>'
     ))
@@ -168,7 +168,7 @@ with col1:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### 🏆 Destaques")
@@ -192,7 +192,8 @@ with col2:
 st.markdown("#### 📊 Tabela Detalhada de Performance")
 
 st.dataframe(
-    seller_perf.style.background_gradient(cmap='Purples', subset=['Faturamento', 'Margem_Liquida'])
+    seller_perf[['Faturamento', 'Ticket_Medio', 'Vendas', 'Itens', 'Desc_Medio', 'Margem_Liquida', 'Margem_%']]
+               .style.background_gradient(cmap='Purples', subset=['Faturamento', 'Margem_Liquida'])
                      .format({
                          'Faturamento': 'R$ {:,.2f}',
                          'Ticket_Medio': 'R$ {:,.2f}',
@@ -214,18 +215,7 @@ st.markdown("### 💸 Impacto do Desconto no Resultado Comercial")
 col1, col2 = st.columns(2)
 
 with col1:
-    # Create discount ranges
-    df['Discount_Range'] = pd.cut(df['Discount'], 
-                                   bins=[0, 0.05, 0.10, 0.15, 0.20, 1.0],
-                                   labels=['0-5%', '5-10%', '10-15%', '15-20%', '>20%'])
-    
-    discount_analysis = df.groupby('Discount_Range').agg({
-        'TotalAmount': ['sum', 'mean', 'count'],
-        'Net_Revenue': 'sum'
-    }).round(2)
-    
-    discount_analysis.columns = ['Faturamento', 'Ticket_Medio', 'Vendas', 'Margem']
-    discount_analysis['Margem_%'] = (discount_analysis['Margem'] / discount_analysis['Faturamento'] * 100).round(1)
+    discount_analysis = get_discount_band_summary(df)
     
     fig = go.Figure()
     
@@ -234,8 +224,10 @@ with col1:
         y=discount_analysis['Faturamento'],
         name='Faturamento',
         marker_color='#8B5CF6',
-        text=discount_analysis['Faturamento'].apply(lambda x: f'R$ {x:,.0f}'),
-        textposition='outside'
+        text=discount_analysis['Faturamento'],
+        texttemplate='R$ %{text:,.0f}',
+        textposition='outside',
+        hovertemplate='<b>%{x}</b><br>Faturamento: R$ %{text:,.0f}<extra></extra>'
     ))
     
     fig.update_layout(
@@ -250,7 +242,7 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     fig = go.Figure()
@@ -262,8 +254,10 @@ with col2:
         name='Margem %',
         line=dict(color='#EF4444', width=3),
         marker=dict(size=12),
-        text=discount_analysis['Margem_%'].apply(lambda x: f'{x:.1f}%'),
-        textposition='top center'
+        text=discount_analysis['Margem_%'],
+        texttemplate='%{text:.1f}%',
+        textposition='top center',
+        hovertemplate='<b>%{x}</b><br>Margem: %{text:.1f}%<extra></extra>'
     ))
     
     fig.update_layout(
@@ -278,22 +272,16 @@ with col2:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
 # Regional Performance
 st.markdown("### 🗺️ Performance Regional (Top 10 Estados)")
 
-state_perf = df[df['OrderStatus'] == 'Delivered'].groupby('State').agg({
-    'TotalAmount': 'sum',
-    'OrderID': 'count',
-    'CustomerID': 'nunique'
-}).round(2)
-
-state_perf.columns = ['Faturamento', 'Vendas', 'Clientes']
-state_perf['Ticket_Medio'] = (state_perf['Faturamento'] / state_perf['Vendas']).round(2)
-state_perf = state_perf.sort_values('Faturamento', ascending=False).head(10)
+state_perf = get_geo_summary(df, 'State', delivered_only=True).head(10).droplevel('Country')
+state_perf = state_perf[['Receita', 'Pedidos', 'Clientes', 'Ticket_Medio']]
+state_perf.columns = ['Faturamento', 'Vendas', 'Clientes', 'Ticket_Medio']
 
 col1, col2 = st.columns([2, 1])
 
@@ -309,7 +297,8 @@ with col1:
             colorscale='Viridis',
             showscale=False
         ),
-        text=state_perf['Faturamento'][::-1].apply(lambda x: f'R$ {x:,.0f}'),
+        text=state_perf['Faturamento'][::-1],
+        texttemplate='R$ %{text:,.0f}',
         textposition='outside',
         hovertemplate='<b>%{y}</b><br>Faturamento: R$ %{x:,.2f}<extra></extra>'
     ))
@@ -326,7 +315,7 @@ with col1:
         height=450
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.dataframe(
@@ -372,12 +361,13 @@ with col2:
 
 with col3:
     # Top performer insight
-    avg_seller_revenue = seller_perf['Faturamento'].mean()
+    avg_seller_revenue = seller_scorecard['Faturamento'].mean()
     top_seller_revenue = seller_perf.iloc[0]['Faturamento']
     gap = top_seller_revenue - avg_seller_revenue
+    top_decile_revenue = get_seller_value_at_percentile(seller_scorecard, 90)
     
     display_insight_box(
         "Gap de Performance",
-        f"Top vendedor fatura R$ {gap:,.2f} acima da média. **Replicar práticas** do {best_seller}.",
+        f"Top vendedor fatura R$ {gap:,.2f} acima da média; o top 10% começa em R$ {top_decile_revenue:,.2f}. **Replicar práticas** do {best_seller}.",
         "🏆"
     )
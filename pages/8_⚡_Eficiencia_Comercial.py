@@ -2,8 +2,8 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from data_processor import load_data, preprocess_data
-from utils import apply_custom_css, display_insight_box
+from data_processor import load_data, preprocess_data, get_derived, get_status_rates, screen_products
+from utils import apply_custom_css, display_insight_box, plotly_chart
 import pandas as pd
 import numpy as np
 
@@ -22,17 +22,20 @@ with st.spinner("Carregando dados..."):
     df = preprocess_data(df_raw)
 
 # Calculate efficiency metrics
+status_counts = get_derived(df, 'status_counts')
+status_rates = get_status_rates(df)
+
 total_orders = len(df)
-delivered = len(df[df['OrderStatus'] == 'Delivered'])
-cancelled = len(df[df['OrderStatus'] == 'Cancelled'])
-returned = len(df[df['OrderStatus'] == 'Returned'])
-pending = len(df[df['OrderStatus'] == 'Pending'])
+delivered = status_counts.get('Delivered', 0)
+cancelled = status_counts.get('Cancelled', 0)
+returned = status_counts.get('Returned', 0)
+pending = status_counts.get('Pending', 0)
 
-efficiency_rate = (delivered / total_orders) * 100
-loss_rate = ((cancelled + returned) / total_orders) * 100
+efficiency_rate = status_rates['Taxa_Entrega_%']
+loss_rate = status_rates['Taxa_Cancelamento_%'] + status_rates['Taxa_Devolucao_%']
 
-total_revenue = df['TotalAmount'].sum()
-lost_revenue = df[df['OrderStatus'].isin(['Cancelled', 'Returned'])]['TotalAmount'].sum()
+total_revenue = status_rates['Faturamento']
+lost_revenue = status_rates['Valor_Perdido']
 
 # Header metrics
 st.markdown("### 🎯 Indicadores de Eficiência")
@@ -79,17 +82,8 @@ st.markdown("---")
 # Análise de Cancelamentos
 st.markdown("### 🚫 Análise de Cancelamentos por Categoria")
 
-cancelled_by_category = df[df['OrderStatus'] == 'Cancelled'].groupby('Category').agg({
-    'OrderID': 'count',
-    'TotalAmount': 'sum'
-}).round(2)
-
-cancelled_by_category.columns = ['Cancelamentos', 'Valor_Perdido']
-
-# Calculate cancellation rate by category
-total_by_category = df.groupby('Category')['OrderID'].count()
-cancelled_by_category['Taxa_%'] = ((cancelled_by_category['Cancelamentos'] / total_by_category) * 100).round(2)
-cancelled_by_category = cancelled_by_category.sort_values('Valor_Perdido', ascending=False)
+# Cancellations, value lost and cancellation rate per category
+cancelled_by_category = get_derived(df, 'cancelled_by_category')
 
 col1, col2 = st.columns(2)
 
@@ -118,7 +112,7 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     fig = go.Figure()
@@ -128,7 +122,8 @@ with col2:
         y=cancelled_by_category['Valor_Perdido'],
         name='Valor Perdido',
         marker_color='#F59E0B',
-        text=cancelled_by_category['Valor_Perdido'].apply(lambda x: f'R$ {x:,.0f}'),
+        text=cancelled_by_category['Valor_Perdido'],
+        texttemplate='R$ %{text:,.0f}',
         textposition='outside',
         hovertemplate='<b>%{x}</b><br>Valor: R$ %{y:,.2f}<extra></extra>'
     ))
@@ -145,7 +140,7 @@ with col2:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 # Cancellation rate table
 st.dataframe(
@@ -163,38 +158,32 @@ st.markdown("---")
 # Análise de Produtos de Baixa Margem
 st.markdown("### 💰 Produtos: Alto Volume vs Baixa Margem")
 
-product_analysis = df[df['OrderStatus'] == 'Delivered'].groupby('ProductName').agg({
-    'TotalAmount': 'sum',
-    'Net_Revenue': 'sum',
-    'OrderID': 'count',
-    'Quantity': 'sum'
-}).round(2)
-
-product_analysis.columns = ['Faturamento', 'Margem_Liquida', 'Vendas', 'Quantidade']
-product_analysis['Margem_%'] = (product_analysis['Margem_Liquida'] / product_analysis['Faturamento'] * 100).round(2)
-product_analysis = product_analysis[product_analysis['Vendas'] >= 10]  # Produtos com volume significativo
+# Produtos com volume significativo, maiores faturamentos primeiro
+product_analysis = screen_products(df, {'Vendas': (10, None)}, sort_by='Faturamento_Entregue')
 
 # Identify problem products: high volume, low margin
 low_margin_threshold = product_analysis['Margem_%'].quantile(0.25)
 high_volume_threshold = product_analysis['Vendas'].quantile(0.75)
 
-problem_products = product_analysis[
-    (product_analysis['Margem_%'] <= low_margin_threshold) &
-    (product_analysis['Vendas'] >= high_volume_threshold)
-].sort_values('Faturamento', ascending=False)
+problem_products = screen_products(
+    df,
+    {'Vendas': (max(10, high_volume_threshold), None), 'Margem_%': (None, low_margin_threshold)},
+    sort_by='Faturamento_Entregue'
+)
 
 col1, col2 = st.columns([2, 1])
 
 with col1:
     # Scatter plot: Sales vs Margin
     fig = px.scatter(
-        product_analysis.reset_index().head(100),
+        product_analysis.head(100),
         x='Vendas',
         y='Margem_%',
-        size='Faturamento',
+        size='Faturamento_Entregue',
         color='Margem_%',
         hover_name='ProductName',
-        hover_data={'Faturamento': ':R$ ,.2f', 'Vendas': ':,', 'Margem_%': ':.1f'},
+        hover_data={'Faturamento_Entregue': ':R$ ,.2f', 'Vendas': ':,', 'Margem_%': ':.1f'},
+        labels={'Faturamento_Entregue': 'Faturamento'},
         color_continuous_scale='RdYlGn',
         title='Matriz: Volume de Vendas vs Margem (%)'
     )
@@ -215,7 +204,7 @@ with col1:
         height=500
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### ⚠️ Produtos Problemáticos")
@@ -223,9 +212,9 @@ with col2:
     
     if len(problem_products) > 0:
         st.markdown("**Top 5 para revisar:**")
-        for idx, (prod, row) in enumerate(problem_products.head(5).iterrows(), 1):
+        for idx, (_, row) in enumerate(problem_products.head(5).iterrows(), 1):
             st.markdown(f"""
-            **{idx}. {prod[:40]}...**  
+            **{idx}. {row['ProductName'][:40]}...**  
             Margem: {row['Margem_%']:.1f}% | Vendas: {row['Vendas']:.0f}
             """)
         
@@ -236,10 +225,7 @@ st.markdown("---")
 # Análise de Métodos de Pagamento
 st.markdown("### 💳 Eficiência por Método de Pagamento")
 
-payment_analysis = df.groupby(['PaymentMethod', 'OrderStatus']).size().unstack(fill_value=0)
-payment_analysis['Total'] = payment_analysis.sum(axis=1)
-payment_analysis['Taxa_Entrega_%'] = (payment_analysis.get('Delivered', 0) / payment_analysis['Total'] * 100).round(2)
-payment_analysis = payment_analysis.sort_values('Taxa_Entrega_%', ascending=False)
+payment_analysis = get_derived(df, 'payment_status_matrix')
 
 col1, col2 = st.columns(2)
 
@@ -284,7 +270,7 @@ with col1:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     fig = go.Figure()
@@ -293,7 +279,8 @@ with col2:
         x=payment_analysis.index,
         y=payment_analysis['Taxa_Entrega_%'],
         marker_color='#8B5CF6',
-        text=payment_analysis['Taxa_Entrega_%'].apply(lambda x: f'{x:.1f}%'),
+        text=payment_analysis['Taxa_Entrega_%'],
+        texttemplate='%{text:.1f}%',
         textposition='outside',
         hovertemplate='<b>%{x}</b><br>Taxa de Entrega: %{y:.2f}%<extra></extra>'
     ))
@@ -310,7 +297,7 @@ with col2:
         height=400
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 st.markdown("---")
 
@@ -323,7 +310,7 @@ with col1:
     # Quick Win 1: Reduzir cancelamentos na pior categoria
     worst_category = cancelled_by_category['Taxa_%'].idxmax()
     worst_rate = cancelled_by_category.loc[worst_category, 'Taxa_%']
-    category_revenue = df[df['Category'] == worst_category]['TotalAmount'].sum()
+    category_revenue = get_derived(df, 'category_totals').loc[worst_category, 'Faturamento']
     potential_gain = category_revenue * (worst_rate / 100) * 0.5  # Reduzir 50%
     
     display_insight_box(
@@ -347,7 +334,7 @@ with col3:
     # Quick Win 3: Corrigir produtos de alta rotação e baixa margem
     if len(problem_products) > 0:
         top_problem = problem_products.iloc[0]
-        margin_impact = top_problem['Faturamento'] * 0.05  # Aumentar margem 5%
+        margin_impact = top_problem['Faturamento_Entregue'] * 0.05  # Aumentar margem 5%
         
         display_insight_box(
             "Quick Win #3: Revisão de Preços",
@@ -395,7 +382,8 @@ with col1:
         x=bottlenecks['Impacto_%'],
         orientation='h',
         marker_color=colors,
-        text=bottlenecks['Impacto_%'].apply(lambda x: f'{x:.2f}%'),
+        text=bottlenecks['Impacto_%'],
+        texttemplate='%{text:.2f}%',
         textposition='outside',
         hovertemplate='<b>%{y}</b><br>Impacto: %{x:.2f}%<extra></extra>'
     ))
@@ -413,7 +401,7 @@ with col1:
         showlegend=False
     )
     
-    st.plotly_chart(fig, width='stretch')
+    plotly_chart(fig)
 
 with col2:
     st.markdown("#### 📋 Priorização de Ações")
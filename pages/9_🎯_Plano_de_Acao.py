@@ -1,9 +1,22 @@
 import streamlit as st
 import plotly.graph_objects as go
-from data_processor import load_data, preprocess_data, get_summary_metrics, get_customer_segments_rfm
+from data_processor import (
+    load_data,
+    preprocess_data,
+    get_summary_metrics,
+    get_customer_segments_rfm,
+    get_commercial_opportunities,
+    get_action_plan_report_inputs,
+    get_seller_scorecard,
+    get_top_sellers,
+    get_seller_percentile,
+    get_discount_band_summary,
+    get_status_counts
+)
 from ai_models import generate_business_insights
 from utils import apply_custom_css, display_insight_box
-from pdf_generator import generate_executive_summary_pdf, create_pdf_download_button
+from pdf_generator import generate_executive_summary_pdf, get_cached_pdf, create_pdf_download_button
+from report_charts import monthly_revenue_chart_spec, seller_ranking_chart_spec
 import pandas as pd
 
 st.set_page_config(page_title="Plano de Ação", page_icon="🎯", layout="wide")
@@ -36,16 +49,15 @@ st.markdown("""
 
 # Calculate key opportunities
 total_revenue = df['TotalAmount'].sum()
-delivered_revenue = df[df['OrderStatus'] == 'Delivered']['TotalAmount'].sum()
-lost_revenue = df[df['OrderStatus'].isin(['Cancelled', 'Returned'])]['TotalAmount'].sum()
 current_conversion = metrics['conversion_rate']
 
-# Opportunities
-opportunity_conversion = (delivered_revenue / current_conversion) * (80 - current_conversion)
-opportunity_margin = delivered_revenue * 0.05  # 5% margin improvement
-opportunity_retention = lost_revenue * 0.3  # 30% de recuperação
-
-total_opportunity = opportunity_conversion + opportunity_margin + opportunity_retention
+opportunities = get_commercial_opportunities(df, metrics)
+delivered_revenue = opportunities['delivered_revenue']
+lost_revenue = opportunities['lost_revenue']
+opportunity_conversion = opportunities['opportunity_conversion']
+opportunity_margin = opportunities['opportunity_margin']
+opportunity_retention = opportunities['opportunity_retention']
+total_opportunity = opportunities['total_opportunity']
 
 st.markdown("---")
 
@@ -132,14 +144,8 @@ with st.expander("**AÇÃO 1: AUMENTAR TAXA DE CONVERSÃO** - Prioridade ALTA 
 with st.expander("**AÇÃO 2: OTIMIZAR MARGEM COMERCIAL** - Prioridade ALTA 🔴"):
     
     # Calculate discount impact
-    discount_analysis = df.groupby(pd.cut(df['Discount'], bins=[0, 0.05, 0.10, 0.15, 0.20, 1.0],
-                                          labels=['0-5%', '5-10%', '10-15%', '15-20%', '>20%'])).agg({
-        'Net_Revenue': 'sum',
-        'TotalAmount': 'sum',
-        'OrderID': 'count'
-    })
-    
-    best_margin_range = ((discount_analysis['Net_Revenue'] / discount_analysis['TotalAmount']) * 100).idxmax()
+    discount_analysis = get_discount_band_summary(df)
+    best_margin_range = discount_analysis['Margem_%'].idxmax()
     
     st.markdown(f"""
     #### 🎯 Objetivo
@@ -178,8 +184,9 @@ with st.expander("**AÇÃO 2: OTIMIZAR MARGEM COMERCIAL** - Prioridade ALTA 🔴
 with st.expander("**AÇÃO 3: REDUZIR PERDAS COMERCIAIS** - Prioridade MÉDIA 🟡"):
     
     # Calculate cancellation by category 
-    worst_category = df[df['OrderStatus'] == 'Cancelled'].groupby('Category').size().idxmax()
-    worst_cancel_count = df[df['OrderStatus'] == 'Cancelled'].groupby('Category').size().max()
+    cancellations = get_status_counts(df, by='Category')['Cancelled']
+    worst_category = cancellations.idxmax()
+    worst_cancel_count = cancellations.max()
     
     st.markdown(f"""
     #### 🎯 Objetivo
@@ -215,12 +222,11 @@ with st.expander("**AÇÃO 3: REDUZIR PERDAS COMERCIAIS** - Prioridade MÉDIA 
     """)
 
 # Action 4: Performance by Seller
-seller_perf = df[df['OrderStatus'] == 'Delivered'].groupby('SellerID').agg({
-    'TotalAmount': 'sum'
-}).sort_values('TotalAmount', ascending=False)
+seller_scorecard = get_seller_scorecard(df)
 
-top_seller_revenue = seller_perf.iloc[0]['TotalAmount']
-avg_seller_revenue = seller_perf['TotalAmount'].mean()
+top_seller_revenue = get_top_sellers(seller_scorecard, 1).iloc[0]['Faturamento']
+avg_seller_revenue = seller_scorecard['Faturamento'].mean()
+share_above_goal = 100 - get_seller_percentile(seller_scorecard, avg_seller_revenue * 1.2)
 
 with st.expander("**AÇÃO 4: EQUALIZAR PERFORMANCE DE VENDEDORES** - Prioridade MÉDIA 🟡"):
     st.markdown(f"""
@@ -256,7 +262,7 @@ with st.expander("**AÇÃO 4: EQUALIZAR PERFORMANCE DE VENDEDORES** - Prioridade
     3. **Gamificação** com desafios mensais
     
     #### 🎯 Meta Trimestral  
-    - 70% da equipe acima de **R$ {avg_seller_revenue * 1.2:,.2f}**/mês
+    - 70% da equipe acima de **R$ {avg_seller_revenue * 1.2:,.2f}**/mês (hoje: {share_above_goal:.0f}%)
     - Reduzir gap entre top e bottom em **40%**
     """)
 
@@ -379,42 +385,16 @@ st.markdown("---")
 
 # PDF Export Button
 st.markdown("### Exportar Relatorio")
-st.markdown("Gere um PDF executivo com KPIs, quick wins e metas do plano.")
-
-margin_pct = (df['Net_Revenue'].sum() / total_revenue) * 100
-roi_projected = ((total_opportunity * 0.7) / 33000) * 100
-
-pdf_metrics = {
-    'delivered_revenue': delivered_revenue,
-    'avg_order_value': metrics['avg_order_value'],
-    'conversion_rate': current_conversion,
-    'margin_pct': margin_pct,
-    'lost_revenue': lost_revenue,
-    'roi_projected': roi_projected
-}
-
-quick_wins_data = [
-    {
-        'title': 'Aumentar Conversao',
-        'description': 'Implementar follow-up em 24h, confirmar pedidos pendentes, reduzir conversao de {:.1f}% para 77%'.format(current_conversion),
-        'gain': opportunity_conversion * 0.3
-    },
-    {
-        'title': 'Otimizar Margem',
-        'description': 'Revisar politica de desconto, treinar equipe em valor, aumentar margem em +2%',
-        'gain': opportunity_margin * 0.4
-    },
-    {
-        'title': 'Reduzir Perdas',
-        'description': 'Investigar cancelamentos, melhorar processo pos-venda, reduzir perdas em -20%',
-        'gain': opportunity_retention * 0.5
-    }
-]
+st.markdown("Gere um PDF executivo com KPIs, quick wins, metas do plano e graficos de tendencia.")
+
+pdf_metrics, quick_wins_data = get_action_plan_report_inputs(df, metrics)
 
 if st.button("Gerar Relatorio PDF", type="primary", width='stretch'):
     with st.spinner("Gerando relatorio em PDF..."):
-        pdf_data = generate_executive_summary_pdf(pdf_metrics, quick_wins_data)
-    create_pdf_download_button(pdf_data, "plano_acao_comercial.pdf", "Baixar Plano de Acao em PDF")
+        chart_specs = [monthly_revenue_chart_spec(df), seller_ranking_chart_spec(seller_scorecard)]
+        pdf_path = get_cached_pdf('plano_acao', generate_executive_summary_pdf,
+                                  pdf_metrics, quick_wins_data, chart_specs)
+    create_pdf_download_button(pdf_path, "plano_acao_comercial.pdf", "Baixar Plano de Acao em PDF")
 
 st.markdown("---")
 
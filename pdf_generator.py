@@ -1,6 +1,36 @@
 from fpdf import FPDF
 from datetime import datetime
 import pandas as pd
+import hashlib
+import json
+import os
+import threading
+import time
+
+from report_charts import render_charts, seller_ranking_chart_spec
+from data_processor import get_top_sellers, get_seller_value_at_percentile
+
+# Bump whenever the report layout changes so cached PDFs are not reused
+PDF_TEMPLATE_VERSION = 4
+PDF_CACHE_DIR = os.path.join('.cache', 'pdf')
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# PDFs returned this recently are never evicted, so a caller can still open the path it got
+PDF_CACHE_PIN_SECONDS = 300
+
+# Seller table layout: (column, header, width, align, format); None is the index
+SELLER_TABLE_COLUMNS = [
+    (None, 'Vendedor', 30, 'L', None),
+    ('Faturamento', 'Faturamento', 40, 'R', 'R$ {:,.0f}'),
+    ('Ticket_Medio', 'Ticket Medio', 30, 'R', 'R$ {:,.0f}'),
+    ('Vendas', 'Vendas', 25, 'C', '{:.0f}'),
+    ('Margem_%', 'Margem %', 25, 'C', '{:.1f}%')
+]
+TABLE_CHUNK_ROWS = 500
+
+# Per-key render locks with the number of callers using them (key -> [lock, users]);
+# an entry is dropped when its last user leaves, so waiters always share one lock
+_render_locks = {}
+_render_locks_guard = threading.Lock()
 
 class ReportPDF(FPDF):
     def __init__(self):
@@ -26,8 +56,68 @@ class ReportPDF(FPDF):
         self.set_text_color(100, 116, 139)
         self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
 
-def generate_executive_summary_pdf(metrics, quick_wins):
-    """Generate executive summary PDF report"""
+def format_table_columns(df, columns):
+    """Format every table column in one pass each; returns a list of string lists"""
+    formatted = []
+    for column, _, _, _, fmt in columns:
+        values = df.index.astype(str).str.slice(0, 10) if column is None else df[column]
+        formatted.append(values.tolist() if fmt is None else values.map(fmt.format).tolist())
+    return formatted
+
+def render_table(pdf, df, columns, row_height=6, chunk_rows=TABLE_CHUNK_ROWS):
+    """Render df as a bordered table, repeating the header on every new page.
+    
+    Rows are formatted in chunks so memory stays bounded for very long tables.
+    """
+    def draw_header():
+        pdf.set_font('Arial', 'B', 9)
+        pdf.set_fill_color(139, 92, 246)
+        pdf.set_text_color(255, 255, 255)
+        for _, title, width, _, _ in columns:
+            pdf.cell(width, 7, title, 1, 0, 'C', True)
+        pdf.ln(7)
+        pdf.set_font('Arial', '', 8)
+        pdf.set_text_color(0, 0, 0)
+    
+    draw_header()
+    layout = [(width, align) for _, _, width, align, _ in columns]
+    
+    for start in range(0, len(df), chunk_rows):
+        formatted = format_table_columns(df.iloc[start:start + chunk_rows], columns)
+        for row in zip(*formatted):
+            if pdf.get_y() + row_height > pdf.page_break_trigger:
+                pdf.add_page()
+                draw_header()
+            for (width, align), text in zip(layout, row):
+                pdf.cell(width, row_height, text, 1, 0, align)
+            pdf.ln(row_height)
+
+def add_charts(pdf, chart_specs, width=180):
+    """Embed rendered chart images, starting a new page when one does not fit"""
+    for path in render_charts(chart_specs):
+        height = width * 0.45  # charts are rendered at an 8 x 3.6 aspect ratio
+        if pdf.get_y() + height > pdf.page_break_trigger:
+            pdf.add_page()
+        pdf.image(path, x=(pdf.w - width) / 2, w=width, h=height)
+        pdf.ln(4)
+
+def write_pdf(pdf, output_path=None):
+    """Write the document to output_path and return the path, or return its bytes"""
+    if output_path is not None:
+        # Goes straight from FPDF's buffer to disk, without an extra bytes copy
+        pdf.output(output_path)
+        return output_path
+    
+    # FPDF2 output can be str/bytes/bytearray depending on version/config.
+    data = pdf.output(dest='S')
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, bytearray):
+        return bytes(data)
+    return str(data).encode('latin-1', errors='replace')
+
+def generate_executive_summary_pdf(metrics, quick_wins, chart_specs=(), output_path=None):
+    """Generate executive summary PDF report, with optional chart specs from report_charts"""
     pdf = ReportPDF()
     
     # Title
@@ -91,22 +181,27 @@ def generate_executive_summary_pdf(metrics, quick_wins):
     
     pdf.ln(5)
     
+    if chart_specs:
+        pdf.set_font('Arial', 'B', 14)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 8, 'Graficos', 0, 1)
+        pdf.ln(2)
+        add_charts(pdf, chart_specs)
+    
     # Footer note
     pdf.set_font('Arial', 'I', 9)
     pdf.set_text_color(100, 116, 139)
     pdf.multi_cell(0, 5, 'Este relatorio foi gerado automaticamente com base na analise de 100.000 transacoes. '
                          'Para detalhes completos, acesse os dashboards interativos.')
     
-    # FPDF2 output can be str/bytes/bytearray depending on version/config.
-    data = pdf.output(dest='S')
-    if isinstance(data, bytes):
-        return data
-    if isinstance(data, bytearray):
-        return bytes(data)
-    return str(data).encode('latin-1', errors='replace')
+    return write_pdf(pdf, output_path)
 
-def generate_performance_pdf(seller_data, metrics):
-    """Generate performance report PDF"""
+def generate_performance_pdf(seller_data, metrics, include_appendix=True, chart_specs=None, output_path=None):
+    """Generate performance report PDF, optionally with every seller in an appendix.
+    
+    seller_data is a seller scorecard (see data_processor.build_seller_scorecard);
+    chart_specs defaults to the top-10 seller ranking chart.
+    """
     pdf = ReportPDF()
     
     # Title
@@ -121,28 +216,11 @@ def generate_performance_pdf(seller_data, metrics):
     pdf.cell(0, 8, 'Top 10 Vendedores', 0, 1)
     pdf.ln(2)
     
-    # Table header
-    pdf.set_font('Arial', 'B', 9)
-    pdf.set_fill_color(139, 92, 246)
-    pdf.set_text_color(255, 255, 255)
-    pdf.cell(30, 7, 'Vendedor', 1, 0, 'C', True)
-    pdf.cell(40, 7, 'Faturamento', 1, 0, 'C', True)
-    pdf.cell(30, 7, 'Ticket Medio', 1, 0, 'C', True)
-    pdf.cell(25, 7, 'Vendas', 1, 0, 'C', True)
-    pdf.cell(25, 7, 'Margem %', 1, 1, 'C', True)
-    
-    # Table data
-    pdf.set_font('Arial', '', 8)
-    pdf.set_text_color(0, 0, 0)
-    
-    for idx, row in seller_data.head(10).iterrows():
-        pdf.cell(30, 6, str(idx)[:10], 1, 0, 'L')
-        pdf.cell(40, 6, f"R$ {row['Faturamento']:,.0f}", 1, 0, 'R')
-        pdf.cell(30, 6, f"R$ {row['Ticket_Medio']:,.0f}", 1, 0, 'R')
-        pdf.cell(25, 6, f"{row['Vendas']:.0f}", 1, 0, 'C')
-        pdf.cell(25, 6, f"{row['Margem_%']:.1f}%", 1, 1, 'C')
+    top_sellers = get_top_sellers(seller_data, 10)
+    render_table(pdf, top_sellers, SELLER_TABLE_COLUMNS)
     
     pdf.ln(5)
+    add_charts(pdf, [seller_ranking_chart_spec(seller_data)] if chart_specs is None else chart_specs)
     
     # Key Insights
     pdf.set_font('Arial', 'B', 12)
@@ -150,24 +228,116 @@ def generate_performance_pdf(seller_data, metrics):
     pdf.ln(2)
     
     pdf.set_font('Arial', '', 10)
-    pdf.multi_cell(0, 5, f"• Top vendedor faturou R$ {seller_data.iloc[0]['Faturamento']:,.2f}\n"
-                         f"• Ticket medio da equipe: R$ {seller_data['Ticket_Medio'].mean():,.2f}\n"
-                         f"• Margem media: {seller_data['Margem_%'].mean():.1f}%\n"
-                         f"• Gap de performance: {((seller_data.iloc[0]['Faturamento'] / seller_data['Faturamento'].mean() - 1) * 100):.1f}%")
+    # Core fonts are latin-1 only, so bullets use a plain dash
+    pdf.multi_cell(0, 5, f"- Top vendedor faturou R$ {top_sellers.iloc[0]['Faturamento']:,.2f}\n"
+                         f"- Faturamento mediano: R$ {get_seller_value_at_percentile(seller_data, 50):,.2f} "
+                         f"(top 10% a partir de R$ {get_seller_value_at_percentile(seller_data, 90):,.2f})\n"
+                         f"- Ticket medio da equipe: R$ {seller_data['Ticket_Medio'].mean():,.2f}\n"
+                         f"- Margem media: {seller_data['Margem_%'].mean():.1f}%\n"
+                         f"- Gap de performance: {((top_sellers.iloc[0]['Faturamento'] / seller_data['Faturamento'].mean() - 1) * 100):.1f}%")
     
-    data = pdf.output(dest='S')
-    if isinstance(data, bytes):
-        return data
-    if isinstance(data, bytearray):
-        return bytes(data)
-    return str(data).encode('latin-1', errors='replace')
+    if include_appendix and len(seller_data) > 10:
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 8, f'Apendice: Todos os Vendedores ({len(seller_data):,})', 0, 1)
+        pdf.ln(2)
+        render_table(pdf, seller_data, SELLER_TABLE_COLUMNS)
+    
+    return write_pdf(pdf, output_path)
+
+def get_report_cache_key(report_name, *inputs):
+    """Hash of the report name, template version and all report inputs"""
+    hasher = hashlib.sha256(f'{report_name}:{PDF_TEMPLATE_VERSION}'.encode('utf-8'))
+    for value in inputs:
+        if isinstance(value, pd.DataFrame):
+            hasher.update(','.join(map(str, value.columns)).encode('utf-8'))
+            hasher.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        else:
+            hasher.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+    return hasher.hexdigest()[:24]
+
+def _evict_pdf_cache(max_bytes=PDF_CACHE_MAX_BYTES, pin_seconds=PDF_CACHE_PIN_SECONDS):
+    """Delete least recently used PDFs until the cache fits in max_bytes, sparing recently used ones"""
+    entries = []
+    for name in os.listdir(PDF_CACHE_DIR):
+        if name.endswith('.pdf'):
+            try:
+                stat = os.stat(os.path.join(PDF_CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    
+    pinned_after = time.time() - pin_seconds
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, name in sorted(entries):
+        if total <= max_bytes or mtime >= pinned_after:
+            break
+        try:
+            os.remove(os.path.join(PDF_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            pass
+
+def get_cached_pdf(report_name, render, *inputs):
+    """Return the path of the cached report, rendering once per unique input.
+    
+    render is called as render(*inputs, output_path=...) and writes the PDF
+    straight to the cache. Concurrent requests for the same report wait for a
+    single render. Cached PDFs keep the generation timestamp of their first render.
+    A returned path is kept on disk for at least PDF_CACHE_PIN_SECONDS.
+    """
+    key = get_report_cache_key(report_name, *inputs)
+    path = os.path.join(PDF_CACHE_DIR, f'{report_name}_{key}.pdf')
+    
+    with _render_locks_guard:
+        entry = _render_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    
+    try:
+        with entry[0]:
+            try:
+                os.utime(path)  # mark as recently used, which also pins it against eviction
+                return path
+            except FileNotFoundError:
+                pass
+            
+            os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                render(*inputs, output_path=tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            _evict_pdf_cache()
+    finally:
+        with _render_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _render_locks[key]
+    
+    return path
 
 def create_pdf_download_button(pdf_data, filename, button_text="📥 Baixar Relatório PDF"):
-    """Create a styled download button for PDF"""
+    """Create a styled download button for PDF bytes or a PDF file path"""
     import streamlit as st
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
+        if isinstance(pdf_data, (str, os.PathLike)):
+            # Hand Streamlit the file itself instead of loading a copy here first
+            with open(pdf_data, 'rb') as f:
+                st.download_button(
+                    label=button_text,
+                    data=f,
+                    file_name=filename,
+                    mime="application/pdf",
+                    width='stretch',
+                    type="secondary"
+                )
+            return
+        
         st.download_button(
             label=button_text,
             data=pdf_data,
@@ -0,0 +1,105 @@
+"""Static chart images for the PDF reports.
+
+Charts are described by small JSON-serialisable specs (kind, title, labels and
+values), rendered to PNG with matplotlib and cached on disk by spec hash, so a
+report that is regenerated with unchanged data reuses the existing images.
+Several missing charts are rendered in parallel worker processes.
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+CHART_CACHE_DIR = os.path.join('.cache', 'charts')
+CHART_RENDER_VERSION = 1  # bump when the chart styling changes
+CHART_WORKERS = 4
+CHART_DPI = 150
+
+def monthly_revenue_chart_spec(df):
+    """Spec for the monthly delivered revenue trend"""
+    delivered = df[df['OrderStatus'] == 'Delivered']
+    monthly = delivered.groupby(delivered['OrderDate'].dt.to_period('M'))['TotalAmount'].sum()
+    return {
+        'kind': 'line',
+        'title': 'Faturamento Mensal (Pedidos Entregues)',
+        'labels': [str(period) for period in monthly.index],
+        'values': [round(float(value), 2) for value in monthly.values],
+        'ylabel': 'Faturamento (R$)'
+    }
+
+def seller_ranking_chart_spec(seller_data, top_n=10):
+    """Spec for the top sellers by revenue"""
+    top = seller_data.head(top_n)
+    return {
+        'kind': 'barh',
+        'title': f'Top {len(top)} Vendedores por Faturamento',
+        'labels': [str(seller) for seller in top.index],
+        'values': [round(float(value), 2) for value in top['Faturamento']],
+        'ylabel': 'Faturamento (R$)'
+    }
+
+def get_chart_spec_hash(spec):
+    """Stable hash of a chart spec and the renderer version"""
+    payload = json.dumps({'version': CHART_RENDER_VERSION, 'spec': spec}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+def get_chart_path(spec):
+    """Cache path of the image for a chart spec"""
+    return os.path.join(CHART_CACHE_DIR, f'{get_chart_spec_hash(spec)}.png')
+
+def render_chart(spec, path):
+    """Render one chart spec to a PNG file (in a worker process or the calling thread)"""
+    # A bare Figure avoids pyplot's global figure state, which is not thread-safe
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    fig = Figure(figsize=(8, 3.6))
+    ax = fig.subplots()
+    money = FuncFormatter(lambda value, _: f'R$ {value:,.0f}')
+
+    if spec['kind'] == 'line':
+        ax.plot(spec['labels'], spec['values'], color='#8b5cf6', linewidth=2, marker='o', markersize=3)
+        ax.yaxis.set_major_formatter(money)
+        ax.set_ylabel(spec['ylabel'])
+        step = max(1, len(spec['labels']) // 12)
+        ax.set_xticks(range(0, len(spec['labels']), step))
+        ax.set_xticklabels(spec['labels'][::step], rotation=45, ha='right', fontsize=8)
+    else:
+        # Largest bar on top
+        ax.barh(spec['labels'][::-1], spec['values'][::-1], color='#3b82f6')
+        ax.xaxis.set_major_formatter(money)
+        ax.set_xlabel(spec['ylabel'])
+        ax.tick_params(axis='y', labelsize=8)
+
+    ax.set_title(spec['title'], fontsize=11)
+    ax.grid(alpha=0.3)
+    fig.tight_layout()
+
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    fig.savefig(tmp_path, dpi=CHART_DPI, format='png')
+    os.replace(tmp_path, path)
+    return path
+
+def render_charts(specs, workers=CHART_WORKERS):
+    """Return image paths for specs, rendering only charts missing from the cache"""
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    paths = [get_chart_path(spec) for spec in specs]
+
+    missing = {}
+    for spec, path in zip(specs, paths):
+        if not os.path.exists(path):
+            missing.setdefault(path, spec)
+
+    workers = min(workers, os.cpu_count() or 1)
+    if len(missing) == 1 or (missing and workers <= 1):
+        for path, spec in missing.items():
+            render_chart(spec, path)
+    elif missing:
+        # spawn keeps workers independent of the Streamlit server's threads
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing)),
+                                 mp_context=mp.get_context('spawn')) as pool:
+            list(pool.map(render_chart, missing.values(), missing.keys()))
+
+    return paths
@@ -1,8 +1,38 @@
+import base64
+import re
+
 import streamlit as st
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+# Built figures are shared across reruns and sessions; each call gets its own
+# copy, so pages can keep calling update_layout() on the result
+FIGURE_CACHE_ENTRIES = 128
+cached_figure = st.cache_data(
+    max_entries=FIGURE_CACHE_ENTRIES,
+    show_spinner=False,
+    hash_funcs={pd.Index: lambda index: pd.util.hash_pandas_object(index).values.tobytes()}
+)
+
+# Line charts are downsampled to roughly one point per horizontal pixel
+TIMELINE_MAX_POINTS = 1000
+
+# Figure data sent to the browser is only rounded to the precision its hover/text
+# templates display, and only when that step stays below FIGURE_ROUND_MAX_STEP of the
+# data's span (sub-pixel); everything else is downcast losslessly or left as is
+FIGURE_ROUND_MAX_STEP = 1e-3
+FIGURE_DATA_PROPS = ('x', 'y', 'z', 'text', 'customdata')
+FIGURE_MARKER_PROPS = ('size', 'color')
+
+# Marker traces above this many points render with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+# Most markers sent to the browser per chart; 3D scenes are heavier to draw
+MAX_MARKER_POINTS = 50_000
+MAX_3D_MARKER_POINTS = 20_000
+
 def apply_custom_css():
     """Apply custom CSS for beautiful UI"""
     st.markdown("""
@@ -123,6 +153,103 @@ def format_number(value):
     else:
         return f"{value:.0f}"
 
+def _as_numeric_array(values):
+    """Numeric numpy view of a trace property, or None when it is not numeric data"""
+    if isinstance(values, dict) and 'bdata' in values:
+        # plotly.express already stores some arrays base64-encoded
+        if 'shape' in values:
+            return None
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=np.dtype(values['dtype']))
+    if values is None or isinstance(values, (str, dict)):
+        return None
+    try:
+        array = np.asarray(values)
+    except (TypeError, ValueError):
+        return None
+    return array if array.dtype.kind in 'iuf' and array.ndim >= 1 else None
+
+def compact_array(array, decimals=None):
+    """Downcast so the array encodes to fewer bytes, rounding first only when decimals is given"""
+    if array.dtype.kind in 'iu':
+        if array.size and np.abs(array).max() < 2 ** 31:
+            return array.astype(np.int32)
+        return array
+    
+    array = array.astype(np.float64)
+    if decimals is not None:
+        array = np.round(array, decimals)
+    finite = array[np.isfinite(array)]
+    if not finite.size:
+        return array.astype(np.float32)
+    largest = np.abs(finite).max()
+    if finite.size == array.size and largest < 2 ** 31 and np.all(finite == np.round(finite)):
+        return array.astype(np.int32)
+    if decimals is None:
+        # Raw data only goes to float32 when that keeps every value exact
+        as_float32 = array.astype(np.float32)
+        return as_float32 if np.array_equal(as_float32, array, equal_nan=True) else array
+    if largest * 10 ** decimals < 2 ** 24:  # float32 still resolves every kept decimal
+        return array.astype(np.float32)
+    return array
+
+def _template_decimals(trace, name):
+    """Finest decimals any template of the trace shows name with, or None if any shows it unrounded"""
+    hovertemplate = trace['hovertemplate'] if 'hovertemplate' in trace else None
+    texttemplate = trace['texttemplate'] if 'texttemplate' in trace else None
+    hoverinfo = trace['hoverinfo'] if 'hoverinfo' in trace else None
+    
+    # Without a template plotly shows the raw value (default hover labels, bar text)
+    if hovertemplate is None and hoverinfo not in ('skip', 'none'):
+        return None
+    if name == 'text' and texttemplate is None:
+        return None
+    
+    decimals = []
+    for template in (hovertemplate, texttemplate):
+        if template is None:
+            continue
+        if not isinstance(template, str):
+            return None
+        for index, spec in re.findall(r'%\{' + name + r'(\[[^\]]*\])?(?::([^}]*))?\}', template):
+            fixed = re.fullmatch(r'[^.]*\.(\d+)([f%])', spec)
+            if index or not fixed:
+                return None
+            decimals.append(int(fixed.group(1)) + (2 if fixed.group(2) == '%' else 0))
+    return max(decimals) if decimals else None
+
+def _rounding_decimals(array, decimals):
+    """decimals when rounding to it moves values by less than FIGURE_ROUND_MAX_STEP of their span"""
+    if decimals is None or array.dtype.kind != 'f':
+        return None
+    finite = array[np.isfinite(array)]
+    if finite.size < 2 or 10.0 ** -decimals > (finite.max() - finite.min()) * FIGURE_ROUND_MAX_STEP:
+        return None
+    return decimals
+
+def compact_figure(fig):
+    """Compact the numeric data of every trace in place; returns fig.
+    
+    Props are rounded only to the precision the trace's templates display them
+    with; marker sizes/colors and everything else are downcast losslessly.
+    With plotly >= 6 the downcast arrays are sent as binary typed arrays.
+    """
+    for trace in fig.data:
+        targets = [(trace, name, _template_decimals(trace, name)) for name in FIGURE_DATA_PROPS]
+        if 'marker' in trace:
+            targets += [(trace.marker, name, None) for name in FIGURE_MARKER_PROPS]
+        for obj, name, decimals in targets:
+            if name not in obj:
+                continue
+            array = _as_numeric_array(obj[name])
+            if array is not None:
+                obj[name] = compact_array(array, _rounding_decimals(array, decimals))
+    return fig
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart with compacted figure data; stretches to the container by default"""
+    kwargs.setdefault('width', 'stretch')
+    st.plotly_chart(compact_figure(fig), **kwargs)
+
 def create_gauge_chart(value, max_value, title):
     """Create a gauge chart for metrics"""
     fig = go.Figure(go.Indicator(
@@ -159,8 +286,63 @@ def create_gauge_chart(value, max_value, title):
     
     return fig
 
-def create_timeline_chart(df, x_col, y_col, title, color='#8B5CF6'):
-    """Create interactive timeline chart"""
+def lttb_indices(x, y, n_out):
+    """Indices of the n_out points kept by Largest-Triangle-Three-Buckets.
+    
+    Keeps the first and last points and, per bucket, the point forming the
+    largest triangle with its neighbours, so peaks and dips survive.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    
+    return indices
+
+def downsample_series(df, x_col, y_col, max_points=TIMELINE_MAX_POINTS):
+    """Downsample a line series (sorted by x_col) with LTTB; small frames are returned as is"""
+    if max_points is None or len(df) <= max_points:
+        return df
+    
+    x = df[x_col]
+    if not pd.api.types.is_numeric_dtype(x):
+        x = pd.to_datetime(x).astype('datetime64[ns]').astype(np.int64)
+    y = df[y_col].fillna(0)
+    return df.iloc[lttb_indices(x.to_numpy(), y.to_numpy(), max_points)]
+
+def use_webgl(n_points, threshold=WEBGL_POINT_THRESHOLD):
+    """Whether a marker trace with n_points should render with WebGL"""
+    return n_points > threshold
+
+def scatter_render_mode(n_points):
+    """render_mode for plotly.express scatter charts"""
+    return 'webgl' if use_webgl(n_points) else 'svg'
+
+def cap_points(df, max_points=MAX_MARKER_POINTS):
+    """At most max_points rows, always the same ones for the same input"""
+    if len(df) <= max_points:
+        return df
+    return df.sample(n=max_points, random_state=0).sort_index()
+
+@cached_figure
+def create_timeline_chart(df, x_col, y_col, title, color='#8B5CF6', max_points=TIMELINE_MAX_POINTS):
+    """Create interactive timeline chart, downsampled to at most max_points"""
+    df = downsample_series(df, x_col, y_col, max_points)
     fig = px.line(df, x=x_col, y=y_col, title=title)
     
     fig.update_traces(
@@ -183,6 +365,7 @@ def create_timeline_chart(df, x_col, y_col, title, color='#8B5CF6'):
     
     return fig
 
+@cached_figure
 def create_bar_chart(df, x_col, y_col, title, orientation='v', color='#8B5CF6'):
     """Create interactive bar chart"""
     if orientation == 'h':
@@ -210,6 +393,7 @@ def create_bar_chart(df, x_col, y_col, title, orientation='v', color='#8B5CF6'):
     
     return fig
 
+@cached_figure
 def create_pie_chart(values, names, title):
     """Create interactive pie chart"""
     fig = px.pie(
@@ -235,13 +419,16 @@ def create_pie_chart(values, names, title):
     
     return fig
 
+@cached_figure
 def create_scatter_plot(df, x_col, y_col, color_col=None, title=''):
     """Create scatter plot with optional color dimension"""
+    df = cap_points(df)
+    render_mode = scatter_render_mode(len(df))
     if color_col:
         fig = px.scatter(df, x=x_col, y=y_col, color=color_col, title=title,
-                        color_continuous_scale='Purples')
+                        color_continuous_scale='Purples', render_mode=render_mode)
     else:
-        fig = px.scatter(df, x=x_col, y=y_col, title=title)
+        fig = px.scatter(df, x=x_col, y=y_col, title=title, render_mode=render_mode)
         fig.update_traces(marker={'color': '#8B5CF6', 'size': 8})
     
     fig.update_layout(
@@ -256,6 +443,7 @@ def create_scatter_plot(df, x_col, y_col, color_col=None, title=''):
     
     return fig
 
+@cached_figure
 def create_heatmap(data, x_labels, y_labels, title):
     """Create correlation heatmap"""
     fig = px.imshow(
@@ -277,10 +465,11 @@ def create_heatmap(data, x_labels, y_labels, title):
     
     return fig
 
+@cached_figure
 def create_3d_scatter(df, x_col, y_col, z_col, color_col, title):
-    """Create 3D scatter plot for clustering visualization"""
+    """Create 3D scatter plot for clustering visualization (capped at MAX_3D_MARKER_POINTS)"""
     fig = px.scatter_3d(
-        df, 
+        cap_points(df, MAX_3D_MARKER_POINTS), 
         x=x_col, 
         y=y_col, 
         z=z_col, 
@@ -304,6 +493,64 @@ def create_3d_scatter(df, x_col, y_col, z_col, color_col, title):
     
     return fig
 
+def create_density_scatter(density, x_col, y_col, title='', points=None, color_col=None,
+                           color_map=None, hover_cols=(), show_trends=True):
+    """Heatmap of a get_scatter_density result with individual points drawn on top.
+    
+    points defaults to the sparse-cell outliers; pass e.g. anomalies to overlay those instead.
+    """
+    counts = density['counts']
+    fig = go.Figure(go.Heatmap(
+        x=density['x'],
+        y=density['y'],
+        z=np.where(counts > 0, np.log10(np.maximum(counts, 1)), np.nan),
+        customdata=counts,
+        colorscale='Purples',
+        colorbar={'title': 'Pedidos', 'tickvals': [0, 1, 2, 3, 4], 'ticktext': ['1', '10', '100', '1k', '10k']},
+        hovertemplate=f'{x_col}: %{{x:,.2f}}<br>{y_col}: %{{y:,.2f}}<br>Pedidos: %{{customdata:,.0f}}<extra></extra>',
+        name='Densidade'
+    ))
+    
+    points = cap_points(density['outliers'] if points is None else points)
+    groups = points.groupby(color_col, observed=True) if color_col else [('Pontos isolados', points)]
+    extra_hover = ''.join(f'<br>{col}: %{{customdata[{i}]}}' for i, col in enumerate(hover_cols))
+    marker_trace = go.Scattergl if use_webgl(len(points)) else go.Scatter
+    for name, group in groups:
+        fig.add_trace(marker_trace(
+            x=group[x_col],
+            y=group[y_col],
+            mode='markers',
+            name=str(name),
+            customdata=group[list(hover_cols)] if hover_cols else None,
+            marker={'size': 5, 'color': (color_map or {}).get(name), 'line': {'width': 0}},
+            hovertemplate=f'{x_col}: %{{x:,.2f}}<br>{y_col}: %{{y:,.2f}}{extra_hover}<extra>{name}</extra>'
+        ))
+    
+    if show_trends:
+        x0, x1 = density['x_range']
+        for name, (slope, intercept) in density['trends'].items():
+            fig.add_trace(go.Scatter(
+                x=[x0, x1],
+                y=[intercept + slope * x0, intercept + slope * x1],
+                mode='lines',
+                name=f'Tendência {name}',
+                line={'width': 2, 'dash': 'dash'},
+                hoverinfo='skip'
+            ))
+    
+    fig.update_layout(
+        title=title,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#F1F5F9'},
+        xaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+        yaxis={'showgrid': True, 'gridcolor': 'rgba(148, 163, 184, 0.1)'},
+        legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1},
+        height=500
+    )
+    
+    return fig
+
 def create_funnel_chart(stages, values, title):
     """Create funnel chart for conversion analysis"""
     fig = go.Figure(go.Funnel(